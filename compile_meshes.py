@@ -1,28 +1,10 @@
 #!/usr/bin/python3
 import os
 import json
+import time
 import argparse
 from core.importfiles import UserEnvironment
-from core.attached_asset import attachedAsset
-from obj3d.object3d import object3d
-
-#
-# we need a dummy class for global containing the environment 
-# and a logLine function provided in inside environment
-#
-
-class globalObjects():
-    def __init__(self, env):
-        self.env = env
-
-def logLine(level, line):
-    if level & 8:
-        print (line)
-
-def compressFile(glob, eqtype, path, source):
-    filename = os.path.join(path, source)
-    asset =  attachedAsset(glob, eqtype, glob.env.numverts)
-    asset.mhcloToMHBin(filename)
+from core.asset_compiler import MeshCompiler
 
 if __name__ == '__main__':
     # get predefined environment parameters (standardmesh)
@@ -35,13 +17,8 @@ if __name__ == '__main__':
 
     uenv = UserEnvironment()
     uenv.GetPlatform()
-    #
-    # now add a few additional environment variables
-    #
-    uenv.logLine = logLine                          # the function we supply directly
-    uenv.verbose = 0                                # do not print comments from makehuman2
-    uenv.basename = release["standardmesh"]         # the meshname
-    uenv.numverts = release["standardnumverts"]     # use to determine delete bool array
+    basename = release["standardmesh"]         # the meshname
+    numverts = release["standardnumverts"]     # use to determine delete bool array
 
     conffile = uenv.GetUserConfigFilenames()[0]
     userspace = None
@@ -57,6 +34,9 @@ if __name__ == '__main__':
         parser.add_argument("-u", action="store_true", help="compile user space instead of system space")
 
     parser.add_argument("-n", action="store_true", help="compile non interactive")
+    parser.add_argument("-f", action="store_true", help="force recompilation of all meshes (otherwise only changed meshes are compiled)")
+    parser.add_argument("-j", type=int, default=None, help="number of parallel processes (default: number of processors)")
+    parser.add_argument("-v", action="store_true", help="print time per mesh")
     parser.add_argument("filename", nargs="?", type=str, help="compile only assets which are similar to this filename")
 
     args = parser.parse_args()
@@ -98,36 +78,30 @@ if __name__ == '__main__':
             if line == "c":
                 okay = True
 
-    glob = globalObjects(uenv)
-
     # first compile base if added to user space or system space
     #
-    num = 0
-    base =  os.path.join(space, "base", uenv.basename, "base.obj")
+    jobs = []
+    base =  os.path.join(space, "base", basename, "base.obj")
     if os.path.isfile (base):
         if args.filename is None or "base" in args.filename:
             print ("Found: " + base)
-            basemesh = object3d(glob, None, "base")
-            (res, err) = basemesh.load(base, True)
-            if res is False:
-                print (err)
-                exit(10)
-            basemesh.exportBinary()
-            num += 1
+            jobs.append(("base", base))
 
     for folder in ["clothes", "eyebrows", "eyelashes", "eyes", "hair", "proxy", "teeth", "tongue"]:
-        absfolder = os.path.join(space, folder, uenv.basename)
+        absfolder = os.path.join(space, folder, basename)
         if os.path.isdir(absfolder):
             for root, dirs, files in os.walk(absfolder, topdown=True):
                 for name in files:
                     if name.endswith(".mhclo") or name.endswith(".proxy"):
-                        if args.filename:
-                            if args.filename in name:
-                                compressFile (glob, folder, root, name)
-                                num += 1
-                        else:
-                            compressFile (glob, folder, root, name)
-                            num += 1
-
-    print (str(num) + " mesh(es) compiled.")
-    exit(0)
+                        if args.filename is None or args.filename in name:
+                            jobs.append((folder, os.path.join(root, name)))
+
+    compiler = MeshCompiler(basename, numverts, 1 if args.v else 0)
+    manifest = os.path.join(space, "mhbin-" + basename + "-manifest.json")
+    start = time.time()
+    (num, uptodate, errors) = compiler.compile(jobs, manifest, args.f, args.j)
+    for err in errors:
+        print (err)
+
+    print ("%d mesh(es) compiled, %d up-to-date, %d error(s), %.2f seconds" % (num, uptodate, len(errors), time.time() - start))
+    exit(10 if len(errors) > 0 else 0)
@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 import os
 import json
+import time
 import argparse
 from core.importfiles import UserEnvironment, TargetASCII
 
@@ -30,6 +31,9 @@ if __name__ == '__main__':
         parser.add_argument("-u", action="store_true", help="compile user space instead of system space")
 
     parser.add_argument("-n", action="store_true", help="compile non interactive")
+    parser.add_argument("-z", action="store_true", help="create old compressed npz file instead of memory mapped target store")
+    parser.add_argument("-f", action="store_true", help="force recompilation of all targets (otherwise only changed targets are parsed)")
+    parser.add_argument("-j", type=int, default=None, help="number of parallel processes (default: number of processors)")
 
     args = parser.parse_args()
 
@@ -60,9 +64,9 @@ if __name__ == '__main__':
                 space = systemspace
                 okay = True
 
-    dest = os.path.join(space, "compressedtargets.npz")
+    dest = os.path.join(space, "compressedtargets.npz" if args.z else "compiledtargets")
     print ("Compile targets in: " + space)
-    print ("Destination file is: " + dest)
+    print ("Destination file is: " + dest + ("" if args.z else "-*.npy"))
     if args.n is False:
         okay = False
         while not okay:
@@ -73,5 +77,7 @@ if __name__ == '__main__':
                 okay = True
 
     at = TargetASCII()
-    at.compressAllTargets(space, dest, 1)
+    start = time.time()
+    (cnt, parsed) = at.compressAllTargets(space, dest, 1, args.f, args.j)
+    print ("%d targets, %d parsed, %.2f seconds" % (cnt, parsed, time.time() - start))
 
@@ -0,0 +1,218 @@
+"""
+compiler for binary meshes (obj or mhclo/proxy + obj -> mhbin)
+
+meshes are compiled in parallel processes. A manifest contains the content hashes of all files
+an mhbin depends on (mhclo, obj, vertex bone weights, material), so only changed meshes are compiled again
+"""
+import os
+import json
+import time
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from core.attached_asset import attachedAsset
+from obj3d.object3d import object3d
+
+class compilerEnvironment():
+    """
+    minimal environment used inside the compiler processes
+    """
+    def __init__(self, basename, numverts, verbose=0):
+        self.basename = basename
+        self.numverts = numverts
+        self.verbose = verbose
+        self.last_error = None
+
+    def logLine(self, level, line):
+        if self.verbose & level:
+            print (line)
+
+class compilerGlobals():
+    def __init__(self, env):
+        self.env = env
+
+# compileMesh must stay a module-level function, it is pickled by name to be sent to the worker processes
+#
+def compileMesh(job):
+    """
+    compile one mesh, runs in a separate process
+
+    :param job: (type, path, basename, number of base vertices, verbose), type "base" means an obj-file
+    :return: path, success, error, seconds
+    """
+    (eqtype, path, basename, numverts, verbose) = job
+    glob = compilerGlobals(compilerEnvironment(basename, numverts, verbose))
+    start = time.time()
+    try:
+        if eqtype == "base":
+            mesh = object3d(glob, None, "base")
+            (okay, err) = mesh.load(path, True)
+            if okay:
+                (okay, err) = mesh.exportBinary()
+        else:
+            asset = attachedAsset(glob, eqtype, numverts)
+            (okay, err) = asset.mhcloToMHBin(path)
+    except Exception as error:
+        (okay, err) = (False, path + ": " + str(error))
+
+    return (path, okay, err, time.time() - start)
+
+
+class MeshCompiler():
+    """
+    compiles a list of meshes in parallel processes, skips meshes which are up-to-date
+    """
+    version = 2     # version of mhbin, a different version in manifest compiles all meshes
+
+    def __init__(self, basename, numverts, verbose=0):
+        self.basename = basename
+        self.numverts = numverts
+        self.verbose = verbose
+
+    def binaryName(self, path):
+        if path.endswith(".mhclo") or path.endswith(".proxy"):
+            return (path[:-6] + ".mhbin")
+        if path.endswith(".obj"):
+            return (path[:-4] + ".mhbin")
+        return (path + ".mhbin")
+
+    def dependencies(self, eqtype, path):
+        """
+        files an mhbin depends on, the source itself and for assets obj-file, vertex bone weights and material
+        only the header of an mhclo is read
+        """
+        deps = [path]
+        if eqtype == "base":
+            return (deps)
+
+        try:
+            fp = open(path, "r", encoding="utf-8", errors='ignore')
+        except IOError:
+            return (deps)
+
+        with fp:
+            for line in fp:
+                words = line.split()
+                if len(words) == 0 or words[0].startswith('#'):
+                    continue
+                key = words[0]
+                key = key[:-1] if key.endswith(":") else key
+                if key in ["verts", "delete_verts"]:
+                    break
+                if key in ["obj_file", "material", "vertexboneweights_file"] and len(words) > 1:
+                    deps.append(os.path.normpath(os.path.join(os.path.dirname(path), words[1])))
+        return (deps)
+
+    def fileHash(self, filename, previous=None):
+        """
+        content hash of a file as [size, mtime, sha1], the hash of the previous entry is reused
+        when size and modification time are unchanged
+        """
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+
+        if previous is not None and previous[0] == st.st_size and previous[1] == st.st_mtime_ns:
+            return (previous)
+
+        h = hashlib.sha1()
+        with open(filename, "rb") as f:
+            h.update(f.read())
+        return ([st.st_size, st.st_mtime_ns, h.hexdigest()])
+
+    def loadManifest(self, filename):
+        """
+        manifest contains per mhbin (relative to manifest) the hashes of the dependencies
+        """
+        if filename is None:
+            return {}
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get("version") != self.version:
+            return {}
+        return (manifest.get("meshes", {}))
+
+    def saveManifest(self, filename, meshes):
+        try:
+            with open(filename, 'w', encoding='utf-8') as f:
+                json.dump({"version": self.version, "meshes": meshes}, f, indent=0, sort_keys=True)
+        except OSError as error:
+            print ("Cannot write manifest " + filename + ": " + str(error))
+
+    def compile(self, jobs, manifestfile=None, force=False, workers=None, callback=None):
+        """
+        compile meshes in parallel processes
+
+        :param jobs: list of (type, path), type is the asset folder or "base" for an obj-file
+        :param manifestfile: manifest with hashes of dependencies, None = no dependency tracking
+        :param force: compile all meshes
+        :param workers: number of processes, None = number of processors
+        :param callback: called for each compiled mesh with path, success, error, seconds
+        :return: number of compiled meshes, number of up-to-date meshes, list of errors
+        """
+        meshes = self.loadManifest(manifestfile)
+        previous = {} if force else dict(meshes)
+        folder = os.path.dirname(manifestfile) if manifestfile is not None else ""
+        tocompile = []
+        uptodate = 0
+
+        # compare content hashes of all dependencies
+        #
+        for (eqtype, path) in jobs:
+            binfile = self.binaryName(path)
+            key = os.path.relpath(binfile, folder) if manifestfile is not None else binfile
+            old = previous.get(key, {})
+            hashes = {}
+            for dep in self.dependencies(eqtype, path):
+                depkey = os.path.relpath(dep, folder) if manifestfile is not None else dep
+                hashes[depkey] = self.fileHash(dep, old.get(depkey))
+
+            # missing files (None) are only okay, when they were missing before
+            #
+            same = os.path.isfile(binfile) and hashes.keys() == old.keys() and \
+                all((hashes[dep] is None and old[dep] is None) or
+                    (hashes[dep] is not None and old[dep] is not None and hashes[dep][2] == old[dep][2]) for dep in hashes)
+            if same:
+                meshes[key] = hashes
+                uptodate += 1
+            else:
+                tocompile.append((key, hashes, (eqtype, path, self.basename, self.numverts, self.verbose)))
+
+        errors = []
+        if len(tocompile) > 0:
+            entries = {job[1]: (key, hashes) for (key, hashes, job) in tocompile}
+            if workers == 1 or len(tocompile) == 1:
+                results = map(compileMesh, [elem[2] for elem in tocompile])
+                self.collectResults(results, entries, meshes, errors, callback)
+            else:
+                # workers are spawned, forking a process with running Qt and worker threads can copy held locks
+                #
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                    futures = [executor.submit(compileMesh, elem[2]) for elem in tocompile]
+                    results = (future.result() for future in as_completed(futures))
+                    self.collectResults(results, entries, meshes, errors, callback)
+
+        if manifestfile is not None:
+            self.saveManifest(manifestfile, meshes)
+
+        return (len(tocompile) - len(errors), uptodate, errors)
+
+    def collectResults(self, results, entries, meshes, errors, callback):
+        """
+        results of compiled meshes, successful meshes are added to manifest
+        """
+        for (path, okay, err, seconds) in results:
+            if self.verbose > 0:
+                print ("%s: %s, %.3f seconds" % (path, "okay" if okay else err, seconds))
+            if okay:
+                (key, hashes) = entries[path]
+                meshes[key] = hashes
+            else:
+                meshes.pop(entries[path][0], None)
+                errors.append(str(err))
+            if callback is not None:
+                callback(path, okay, err, seconds)
@@ -1,64 +1,10 @@
 import os
 import numpy as np
 from core.debug import dumper
-from obj3d.fops_binary import exportObj3dBinary, importObjValues
+from obj3d.fops_binary import exportObj3dBinary, importObjValues, loadBinary
 from obj3d.object3d  import object3d
 from obj3d.bone import boneWeights
 
-class referenceVerts:
-    def __init__(self):
-        pass
-
-    def __str__(self):
-        return("N:"+ str(self._verts) + " W:" + str(self._weights) + " O:" + str(self._offset))
-
-    def identicalValue(self, words, vnum, vertWeights):
-        v0 = int(words[0])
-        self._verts = (v0,v0,v0)
-        self._weights = (1.0,0.0,0.0)
-        self._offset = np.zeros(3, float)
-        if v0 in vertWeights:
-            vertWeights[v0].append((vnum, 1))
-        else:
-            vertWeights[v0] = [(vnum,1)]
-        return self
-
-    def fromTriple(self, words, vnum, vertWeights):
-        v0 = int(words[0])
-        v1 = int(words[1])
-        v2 = int(words[2])
-        w0 = float(words[3])
-        w1 = float(words[4])
-        w2 = float(words[5])
-        if len(words) > 6:
-            d0 = float(words[6])
-            d1 = float(words[7])
-            d2 = float(words[8])
-        else:
-            (d0,d1,d2) = (0,0,0)
-
-        self._verts = (v0,v1,v2)
-        self._weights = (w0,w1,w2)
-        self._offset = np.array((d0,d1,d2), float)
-
-        if v0 in vertWeights:
-            vertWeights[v0].append((vnum, w0))
-        else:
-            vertWeights[v0] = [(vnum,w0)]
-
-        if v1 in vertWeights:
-            vertWeights[v1].append((vnum, w1))
-        else:
-            vertWeights[v1] = [(vnum,w1)]
-
-        if v2 in vertWeights:
-            vertWeights[v2].append((vnum, w2))
-        else:
-            vertWeights[v2] = [(vnum,w2)]
-
-        return self
-
-
 class attachedAsset:
     """
     attached asset represents a mesh added to the base mesh
@@ -72,7 +18,9 @@ class attachedAsset:
         self.version = 110
         self.z_depth = 1 if eqtype == "proxy" else 50
         self.obj = None             # will contain the object3d class
-        self.vertWeights = {}       # will contain the parent weight
+        self.vertWeights = None     # will contain the parent weight (inverse map, created on demand)
+        self.refstart = None        # base vertex -> rows of ref_vIdxs: start in refrows per base vertex (created on demand)
+        self.refrows = None         # rows of ref_vIdxs sorted by base vertex
         self.description = ""
         self.license = ""
         self.author = ""
@@ -120,9 +68,11 @@ class attachedAsset:
         #          2, read delete_verts
         #
         status = 0
-        refVerts = [] # local reference for vertices
-        vnum   = 0    # will contain the vertex number (counting from 0 to x)
+        vertlines = []  # lines of reference vertices, parsed at the end
+        vertcols = []   # number of columns per line
         self.deleteVerts = np.zeros(self.base_verts, bool)
+        self.vertWeights = None
+        self.refstart = None
 
         for line in fp:
             words = line.split()
@@ -148,18 +98,13 @@ class attachedAsset:
 
             if status == 1:
                 if key.isnumeric():
-                    refVert = referenceVerts()
-                    refVerts.append(refVert)
-                    if len(words) == 1:
-                        value = refVert.identicalValue(words, vnum, self.vertWeights)
-                    else:
-                        refVert.fromTriple(words, vnum, self.vertWeights)
-                    vnum += 1
+                    vertlines.append(line)
+                    vertcols.append(len(words))
                     continue
 
             elif status == 2:
 
-                # delete vertices
+                # delete vertices, sequences are set by slicing
                 #
                 sequence = False
                 for v in words:
@@ -168,8 +113,7 @@ class attachedAsset:
                     else:
                         v1 = int(v)
                         if sequence:
-                            for vn in range(v0,v1+1):
-                                self.deleteVerts[vn] = True
+                            self.deleteVerts[v0:v1+1] = True
                             sequence = False
                         else:
                             self.deleteVerts[v1] = True
@@ -217,9 +161,7 @@ class attachedAsset:
 
         # finally create the numpy arrays here
         #
-        self.weights = np.asarray([v._weights for v in refVerts], dtype=np.float32)
-        self.ref_vIdxs = np.asarray([v._verts for v in refVerts], dtype=np.uint32)
-        self.offsets = np.asarray([v._offset for v in refVerts], dtype=np.float32)
+        (self.ref_vIdxs, self.weights, self.offsets) = self.parseReferenceVerts(vertlines, vertcols)
         if self.type == "proxy":
             self.z_depth = 1
 
@@ -229,6 +171,76 @@ class attachedAsset:
 
         return (True, "Okay")
 
+    def parseReferenceVerts(self, lines, columns):
+        """
+        parse reference vertices, lines with the same number of columns are parsed in one step
+        a line is either v0 (identical to base vertex) or v0 v1 v2 w0 w1 w2 [d0 d1 d2]
+
+        :param lines: lines of verts section
+        :param columns: number of columns per line
+        :return: ref_vIdxs (uint32), weights and offsets (float32), all [n, 3]
+        """
+        columns = np.asarray(columns, dtype=np.int64)
+        values = np.zeros((len(lines), 9), dtype=np.float64)
+        for cnt in np.unique(columns).tolist():
+            rows = np.flatnonzero(columns == cnt)
+            part = np.fromstring(" ".join([lines[i] for i in rows]), dtype=np.float64, sep=" ")
+            if part.size != len(rows) * cnt:
+                part = np.asarray([[float(x) for x in lines[i].split()] for i in rows], dtype=np.float64)
+            part = part.reshape(len(rows), cnt)
+
+            if cnt == 1:
+                # identical values: (v0, v0, v0), (1, 0, 0), (0, 0, 0)
+                #
+                values[rows, 0:3] = part
+                values[rows, 3] = 1.0
+            else:
+                values[rows, :min(cnt, 9)] = part[:, :9]
+
+        return (values[:,:3].astype(np.uint32), values[:,3:6].astype(np.float32), values[:,6:9].astype(np.float32))
+
+    def getVertWeights(self):
+        """
+        inverse weight map, base vertex -> [(asset vertex, weight), ...], created only when needed
+        """
+        if self.vertWeights is None:
+            # numpy: sort all references by base vertex (stable, to keep the order of asset vertices)
+            # for idx in range(len(ref_vIdxs)):
+            #    for l in range(3):
+            #        vertWeights[ref_vIdxs[idx, l]].append((idx, weights[idx, l]))
+            #
+            base = self.ref_vIdxs.ravel()
+            order = np.argsort(base, kind='stable')
+            (bverts, start) = np.unique(base[order], return_index=True)
+            idx = (order // 3).tolist()
+            w = self.weights.ravel()[order]
+            end = np.append(start[1:], len(order)).tolist()
+            self.vertWeights = {}
+            for bvert, s, e in zip(bverts.tolist(), start.tolist(), end):
+                self.vertWeights[bvert] = list(zip(idx[s:e], w[s:e]))
+        return (self.vertWeights)
+
+    def referencedRows(self, verts):
+        """
+        rows of ref_vIdxs (= asset vertices) which reference one of the base vertices
+        the index base vertex -> rows is created on first use
+
+        :param verts: numbers of changed base vertices
+        """
+        if self.refstart is None:
+            base = self.ref_vIdxs.ravel()
+            self.refrows = np.argsort(base, kind='stable') // 3
+            self.refstart = np.zeros(self.base_verts + 1, dtype=np.int64)
+            np.cumsum(np.bincount(base, minlength=self.base_verts)[:self.base_verts], out=self.refstart[1:])
+
+        # numpy: concatenate refrows[refstart[v]:refstart[v+1]] for all v
+        #
+        verts = np.asarray(verts, dtype=np.int64)
+        start = self.refstart[verts]
+        cnt = self.refstart[verts + 1] - start
+        index = np.repeat(start - (np.cumsum(cnt) - cnt), cnt) + np.arange(int(np.sum(cnt)))
+        return (np.unique(self.refrows[index]))
+
     def createScaleMatrix(self, mesh):
         # 
         # try to work with None as well
@@ -251,7 +263,7 @@ class attachedAsset:
 
     def importBinary(self, path):
         self.env.logLine(8, "Read binary asset " + path)
-        npzfile = np.load(path)
+        npzfile = loadBinary(path)
         for elem in ['asset', 'files', 'ref_vIdxs', 'weights']:
             if elem not in npzfile:
                 error =  "Malformed file, missing component " + elem
@@ -301,6 +313,9 @@ class attachedAsset:
             self.weights = np.zeros((num_refs,3), dtype=np.float32)
             self.weights[:,0] = npzfile['weights']
 
+        self.vertWeights = None
+        self.refstart = None
+
         if "deleteVerts" in npzfile:
             self.deleteVerts = npzfile["deleteVerts"]
 
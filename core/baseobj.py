@@ -1,9 +1,11 @@
 import os
+import numpy as np
 from core.target import Targets
 from core.attached_asset import attachedAsset
 from obj3d.object3d import object3d
 from obj3d.skeleton import skeleton
 from obj3d.animation import BVH, MHPose, FaceUnits
+from obj3d.animation_cache import AnimationCache
 from core.debug import memInfo, dumper
 from core.target import Modelling
 from gui.common import WorkerThread, ErrorBox
@@ -15,6 +17,7 @@ class MakeHumanModel():
         self.version = None
         self.skinMaterial = None
         self.skeleton = None
+        self.skinning = None
         self.modifiers = []
         self.attached = []
         self.materials = []
@@ -51,6 +54,9 @@ class baseClass():
         self.name = name                # will hold the character name
         self.pose_skeleton = None
         self.default_skeleton = None
+        self.hiddencache = {}           # (mesh, hidden base verts) -> index without hidden triangles
+        self.animcache = None           # precalculated frames of animation
+        self.animthread = None
         self.reset()
         memInfo()
 
@@ -70,6 +76,7 @@ class baseClass():
         self.expression = None      # indicates that expressions are used
         self.faceunits  = None      # indicates that face-units are initalized
         self.hide_verts = True      # hide vertices
+        self.skinning = "linear"    # skinning method, "linear" or "dualquaternion"
 
     def loadMHMFile(self, filename, verbose=None):
         """
@@ -97,7 +104,7 @@ class baseClass():
                 continue
 
             key = words[0]
-            if key in ["version", "uuid", "skinMaterial", "skeleton"]:
+            if key in ["version", "uuid", "skinMaterial", "skeleton", "skinning"]:
                 setattr (loaded, key, words[1])
             elif key == "name":
                 loaded.name = " ".join(words[1:])
@@ -147,6 +154,7 @@ class baseClass():
         if loaded.name is not None:
             self.name = loaded.name
         self.tags = loaded.tags
+        self.skinning = "dualquaternion" if loaded.skinning == "dualquaternion" else "linear"
         self.uuid = loaded.uuid
 
         if loaded.skinMaterial is not None:
@@ -261,9 +269,32 @@ class baseClass():
         if self.skeleton is not None:
             fp.write ("skeleton " + self.skeleton.name + "\n")
 
+        # skinning method (only when not default)
+        #
+        if self.skinning != "linear":
+            fp.write ("skinning " + self.skinning + "\n")
+
         fp.close()
         return (True)
 
+    def hideCached(self, mesh, verts, asset=None):
+        """
+        hide triangles of base mesh or an asset, the index is cached per mesh and hidden vertices of the base
+        (these depend on the assets attached before)
+        """
+        key = (mesh.filename, np.packbits(verts).tobytes())
+        if key in self.hiddencache:
+            mesh.gl_hicoord = self.hiddencache[key]
+            return
+
+        if asset is None:
+            mesh.hideVertices(verts)
+        else:
+            mesh.hideApproxVertices(asset, self.baseMesh, verts)
+        if len(self.hiddencache) > 64:
+            self.hiddencache = {}
+        self.hiddencache[key] = mesh.gl_hicoord
+
     def calculateDeletedVerts(self):
         if self.hide_verts is False:
             for elem in self.attachedAssets:
@@ -280,12 +311,12 @@ class baseClass():
                     elem.obj.notHidden()
                 else:
                     print ("Join + new delete verts: " + elem.name)
-                    elem.obj.hideApproxVertices(elem, self.baseMesh, verts)
+                    self.hideCached(elem.obj, verts, elem)
                     verts |= elem.deleteVerts
             else:
                 if verts is not None:
                     print ("Join no new delete verts: " + elem.name)
-                    elem.obj.hideApproxVertices(elem, self.baseMesh, verts)
+                    self.hideCached(elem.obj, verts, elem)
                 else:
                     elem.obj.notHidden()
 
@@ -294,7 +325,7 @@ class baseClass():
         if verts is None:
             self.baseMesh.notHidden()
         else:
-            self.baseMesh.hideVertices(verts)
+            self.hideCached(self.baseMesh, verts)
 
     def getLowestPos(self):
         """
@@ -443,20 +474,50 @@ class baseClass():
         self.glob.openGLWindow.Tweak()
 
     def showPose(self):
-        self.pose_skeleton.pose(self.bvh.joints, self.bvh.currentFrame)
+        self.pose_skeleton.pose(self.bvh.joints, self.bvh.frame(self.bvh.currentFrame))
         #self.bvh.debugChanged()
         self.glob.openGLWindow.Tweak()
 
     def showPoseAndExpression(self):
         if self.bvh:
-            self.pose_skeleton.pose(self.bvh.joints, self.bvh.currentFrame)
+            self.pose_skeleton.pose(self.bvh.joints, self.bvh.frame(self.bvh.currentFrame))
         if self.expression:
             self.pose_skeleton.posebyBlends(self.expression.blends, self.faceunits.bonemask )
 
+    def bakeAnimation(self):
+        """
+        precalculate frames of the animation in a background thread, memory budget in MB from configuration
+        """
+        self.dropAnimationCache()
+        if self.bvh is None or self.pose_skeleton is None or self.pose_skeleton.getFKSolver() is None:
+            return
+        budget = self.env.config.get("animation_cache", 512)
+        self.animcache = AnimationCache(self.glob, self.pose_skeleton, self.bvh, budget)
+        self.animthread = WorkerThread(self.animcache.bake)
+        self.animthread.start()
+
+    def dropAnimationCache(self):
+        if self.animcache is not None:
+            self.animcache.stop()
+            self.animcache = None
+        if self.animthread is not None:
+            self.animthread.wait()
+            self.animthread = None
+
+    def setSkinning(self, method):
+        """
+        change skinning method and pose again
+        """
+        self.dropAnimationCache()
+        self.skinning = method
+        if self.pose_skeleton is not None and (self.bvh or self.expression):
+            self.showPoseAndExpression()
+
     def addPose(self, name, path):
         if self.pose_skeleton is None:
             return True
 
+        self.dropAnimationCache()
         if self.bvh is not None:
             self.pose_skeleton.restPose()
             self.glob.markAssetByFileName(self.bvh.filename, False)
@@ -470,6 +531,7 @@ class baseClass():
         return loaded
 
     def delPose(self, path):
+        self.dropAnimationCache()
         self.bvh = None
         self.glob.markAssetByFileName(path, False)
         self.pose_skeleton.restPose()
@@ -493,6 +555,7 @@ class baseClass():
         if self.getFaceUnits() is None:
            return
 
+        self.dropAnimationCache()
         if self.expression is not None:
             self.glob.markAssetByFileName(self.expression.filename, False)
             self.pose_skeleton.restPose()
@@ -506,6 +569,7 @@ class baseClass():
             self.glob.markAssetByFileName(path, True)
 
     def delExpression(self, path):
+        self.dropAnimationCache()
         self.expression = None
         self.glob.markAssetByFileName(path, False)
         self.pose_skeleton.restPose()
@@ -606,9 +670,25 @@ class baseClass():
     def updateByTarget(self, factor, decr, incr):
         """
         update all meshes by target
+        only assets referencing vertices of the targets are changed (not when posed)
         """
         self.baseMesh.updateByTarget(factor, decr, incr)
-        self.updateAttachedAssets()
+
+        verts = [target.verts for target in (decr, incr) if target is not None and target.loaded]
+        if len(verts) == 0 or self.bvh is not None or self.expression is not None:
+            self.updateAttachedAssets()
+            for asset in self.attachedAssets:
+                asset.obj.markUnchanged(False)
+            return
+
+        verts = np.concatenate(verts)
+        for asset in self.attachedAssets:
+            rows = asset.referencedRows(verts)
+            if len(rows) > 0:
+                asset.obj.approxToBasemesh(asset, self.baseMesh, rows)
+                asset.obj.markUnchanged(False)
+            else:
+                asset.obj.markUnchanged()
 
     def applyAllTargets(self, bckproc=None, args=None):
         """
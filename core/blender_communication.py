@@ -252,38 +252,29 @@ class blendCom:
     def addWeightBuffers(self, coords, bweights):
         wpvlen = len(coords) // 3   # length of vertex per face derived from flattened coords
 
-        lsize = 0
-
-        vertex = {}
-
         # TODO: how to deal with empty weights
 
-        for bone, t in bweights.items():
-            bonenumber = self.bonenames[bone]
-            ind, w = bweights[bone]
-            for n, i in enumerate (ind):
-                if i < wpvlen:
-                    if i not in vertex:
-                        vertex[i] = []
-                    vertex[i].append((bonenumber, w[n]))
-                    lsize += 1
-
-        #print ("Verts:" + str(wpvlen))
-        #print ("Weight array:" + str(lsize))
-        weightpervertex = np.zeros(wpvlen, dtype=np.dtype('i1'))
-        joints =  np.zeros(lsize, dtype=np.dtype('i4'))
-        weights = np.zeros(lsize, dtype=np.float32)
-
-        i = 0
-        for j in range(0, wpvlen):
-            cnt = 0
-            if j in vertex:
-                for n,w in vertex[j]:
-                    joints[i] = n
-                    weights[i] = w
-                    i += 1
-                    cnt += 1
-            weightpervertex[j] = cnt
+        # numpy: collect (vertex, bone, weight) of all bones, sort by vertex (stable, so bone order is kept)
+        # for j in range(0, wpvlen):
+        #    for n,w in vertex[j]:
+        #        joints[i] = n ; weights[i] = w
+        #    weightpervertex[j] = len(vertex[j])
+        #
+        inds = [np.zeros(0, dtype=np.int64)]
+        bones = [np.zeros(0, dtype=np.int32)]
+        ws = [np.zeros(0, dtype=np.float32)]
+        for bone, (ind, w) in bweights.items():
+            ind = np.asarray(ind, dtype=np.int64)
+            used = ind < wpvlen
+            inds.append(ind[used])
+            bones.append(np.full(np.count_nonzero(used), self.bonenames[bone], dtype=np.int32))
+            ws.append(np.asarray(w, dtype=np.float32)[used])
+
+        ind = np.concatenate(inds)
+        order = np.argsort(ind, kind='stable')
+        joints = np.concatenate(bones)[order].astype(np.dtype('i4'))
+        weights = np.concatenate(ws)[order]
+        weightpervertex = np.bincount(ind, minlength=wpvlen).astype(np.dtype('i1'))
 
         bufwpv    = self.addBufferView(self.WPV_BUFFER, weightpervertex.tobytes())
         bufjoint  = self.addBufferView(self.JOINT_BUFFER, joints.tobytes())
@@ -293,7 +284,7 @@ class blendCom:
 
     def addMesh(self, obj, nodenumber, bweights):
         self.mesh_cnt += 1
-        (coords, norm, uvcoords, vpface, faces, overflows) = obj.getVisGeometry(self.hiddenverts)
+        (coords, norm, uvcoords, vpface, faces, overflows, weights) = obj.getVisGeometry(self.hiddenverts, bweights=bweights)
         # norm is not used
         pos = self.addPosBuffer(coords)
         face = self.addFaceBuffer(faces)
@@ -310,8 +301,8 @@ class blendCom:
 
         # add weights in case of skeleton
         #
-        if bweights is not None:
-            attrib["WPV"], attrib["JOINTS"], attrib["WEIGHTS"] = self.addWeightBuffers(coords, bweights)
+        if weights is not None:
+            attrib["WPV"], attrib["JOINTS"], attrib["WEIGHTS"] = self.addWeightBuffers(coords, weights)
 
         jmesh = {"primitives": [ {"attributes": attrib, "material": nodenumber }]}
 
@@ -1,7 +1,7 @@
 """
 bvh exporter
 
-in export we use order XYZ always
+in export we use the rotation order of the loaded animation (XYZ for joints not in animation)
 atm only rotation is used for all bones except root
 
 Options:
@@ -25,7 +25,6 @@ class bvhExport:
 
         self.bvh = BVH(glob, "export")
         self.skeldef = []
-        self.motion = []
     
     def calcJoints(self, bones):
         for name, bone in bones.items():
@@ -43,6 +42,15 @@ class bvhExport:
                 joint.channels = None
 
 
+    def setRotationOrder(self, sourcebvh):
+        """
+        use the rotation order of the source, because the angles are only valid in this order
+        """
+        for joint in self.bvh.bvhJointOrder:
+            if joint.channels is not None and joint.name in sourcebvh.joints:
+                rotation = [axis + "rotation" for axis in sourcebvh.joints[joint.name].rotorder]
+                joint.channels = joint.channels[:-3] + rotation
+
     def writeJoint(self, joint, l):
         name = joint.name
         l1 = l+1
@@ -66,7 +74,18 @@ class bvhExport:
             self.writeJoint(b, l1)
         self.skeldef.append("\t" * l + "}\n")
 
-    def writeMotion(self, destbvh, sourcebvh):
+    def hierarchyOrder(self, joint):
+        """
+        joints in the order they are written by writeJoint
+        """
+        joints = [joint]
+        for child in joint.children:
+            joints.extend(self.hierarchyOrder(child))
+        return (joints)
+
+    def writeMotion(self, destbvh, sourcebvh, fp):
+        #
+        # frames are written line by line, so a streamed source animation is decoded window by window
         #
         # TODO:
         # create a mapping from source to dest 
@@ -76,10 +95,10 @@ class bvhExport:
         jointtable = []
         jointmap = {}
 
-        # collect all new joints and save index in dict
+        # collect all new joints and save index in dict, motion uses the order of the hierarchy (depth first)
         #
         cnt = 0
-        for joint in destbvh.bvhJointOrder:
+        for joint in self.hierarchyOrder(destbvh.bvhJointOrder[0]):
             if joint.channels is not None:
                 jointtable.append([joint, None])
                 jointmap[joint.name] = cnt
@@ -97,6 +116,7 @@ class bvhExport:
         for frame in range(0, sourcebvh.frameCount):
 
             line = ""
+            row = sourcebvh.frame(frame)
 
             for cnt, (destjoint, sourcejoint)  in enumerate(jointtable):
                 # get animdata from source
@@ -108,9 +128,10 @@ class bvhExport:
                 else:
                     # write short output in case a bone is not changed
                     #
-                    f = sourcejoint.animdata[frame]
+                    f = sourcejoint.animdata[row]
+                    rotation = [self.bvh.channelname[channel] for channel in destjoint.channels[-3:]]
                     if channels == 3:
-                        for c in [3, 4, 5]:
+                        for c in rotation:
                             if f[c] == 0.0:
                                 line += "0 "
                             else:
@@ -122,7 +143,7 @@ class bvhExport:
                         else:
                             line += ("%f %f %f " % (pos[0], pos[1], pos[2]))
 
-                        for c in [3, 4, 5]:
+                        for c in rotation:
                             if f[c] == 0.0:
                                 line += "0 "
                             else:
@@ -132,7 +153,7 @@ class bvhExport:
             #
             if len(line) > 0 and line[-1] == ' ':
                 line = line[:-1] + '\n'
-                self.motion.append(line)
+                fp.write(line)
 
     def ascSave(self, baseclass, filename):
 
@@ -149,12 +170,12 @@ class bvhExport:
 
         bones = baseclass.skeleton.bones
         self.calcJoints(bones)
+        self.setRotationOrder(baseclass.bvh)
 
         header ="HIERARCHY\n"
         self.writeJoint(self.bvh.bvhJointOrder[0], 0)
 
         frameheader = "MOTION\nFrames: %s\nFrame Time: %f\n" % (baseclass.bvh.frameCount, baseclass.bvh.frameTime)
-        self.writeMotion(self.bvh, baseclass.bvh)
 
         try:
             with open(filename, 'w', encoding="utf-8") as f:
@@ -162,8 +183,7 @@ class bvhExport:
                 for line in self.skeldef:
                     f.write(line)
                 f.write(frameheader)
-                for line in self.motion:
-                    f.write(line)
+                self.writeMotion(self.bvh, baseclass.bvh, f)
 
         except IOError as error:
             self.env.last_error = str(error)
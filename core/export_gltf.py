@@ -2,6 +2,7 @@ import os
 import json
 import struct
 import numpy as np
+import core.math as mquat
 from obj3d.skeleton import skeleton as newSkeleton
 
 """
@@ -91,6 +92,7 @@ class gltfExport:
 
         self.bonelist = []      # helps to keep the order of the bones
         self.bonenames = {}
+        self.restquats = {}     # rotation of local rest matrix per bone
 
         self.meshindices = []   # holds meshindices for joints and weights
 
@@ -184,12 +186,14 @@ class gltfExport:
     def addBindMatAccessor(self, bonelist):
         self.accessor_cnt += 1
         cnt = len(bonelist)
-        bindmat = np.zeros((cnt, 4,4), dtype=np.float32)
-        n = 0
-        for elem in self.bonenames:
-            bone = self.bonenames[elem][1]
-            bindmat[n], bindinv = bone.getBindMatrix(0, 'y')
-            n += 1
+
+        # numpy: all bind matrices in one step
+        # for elem in self.bonenames:
+        #    bindmat[n], bindinv = bone.getBindMatrix(0, 'y')
+        #
+        restmats = np.asarray([self.bonenames[elem][1].matRestGlobal for elem in self.bonenames])
+        restmats = mquat.changeOrientations(restmats, 0, 'y')
+        bindmat = np.linalg.inv(np.transpose(restmats, (0, 2, 1))).astype(np.float32)
 
         data = bindmat.tobytes()
         buf = self.addBufferView(None, data)
@@ -413,8 +417,7 @@ class gltfExport:
         #
         trans = bone.getLocalTransitionVector().tolist()
 
-        rot   = bone.getLocalRotationQVector()
-        rot[[0, 1, 2, 3]] = rot[[1, 2, 3, 0]]       # change quaternion order (W is last element)
+        rot   = self.restquats[bone.name][[1, 2, 3, 0]]   # change quaternion order (W is last element)
         rot = rot.tolist()
 
         node = {"name": bone.name, "translation": trans, "rotation": rot, "children": []  }
@@ -490,6 +493,12 @@ class gltfExport:
             else:
                 skeleton = baseclass.skeleton
 
+            # rotations of all local rest matrices in one step
+            #
+            restmats = np.asarray([bone.matRestLocal for bone in skeleton.bones.values()])
+            quats = mquat.quaternionsFromMatrices(restmats).astype(np.float32)
+            self.restquats = dict(zip(skeleton.bones, quats))
+
             bonename = list(skeleton.bones)[0]
             bone = skeleton.bones[bonename]
 
@@ -2,8 +2,12 @@ from io import BytesIO
 from urllib.request import Request, urlopen
 from urllib.error import URLError
 from zipfile import ZipFile
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import numpy as np
 import os
+import json
+import warnings
 import sys
 import shutil
 import platform
@@ -140,6 +144,14 @@ class AssetPack():
                     print (destname)
                     shutil.copyfile(sourcename, destname)
 
+# loadTarget must stay a module-level function, it is pickled by name to be sent to the worker processes
+#
+def loadTarget(filename):
+    """
+    parse one ascii target, runs in a separate process
+    """
+    return (TargetASCII().load(filename))
+
 class TargetASCII():
     """
     the class should also support stand-alone compressor
@@ -149,24 +161,47 @@ class TargetASCII():
         pass
 
     def load(self, filename):
-        data = []
+        """
+        the whole file is parsed by numpy, lines are: vertex x y z
+        files with lines of a different format are parsed line by line
+        """
         dtype = [('index','u4'),('vector','(3,)f4')]
         try:
-            fd = open(filename, 'r', encoding='utf-8')
-        except:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)  # empty targets
+                values = np.loadtxt(filename, comments='#', dtype=np.float64, ndmin=2, encoding='utf-8')
+        except OSError:
             return (False, None)
-        else:
-            for line in fd:
-                line = line.strip()
-                if line.startswith('#'):
-                    continue
-                translationData = line.split()
-                if len(translationData) != 4:
-                    continue
-                vertIndex = int(translationData[0])
-                translationVector = (float(translationData[1]), float(translationData[2]), float(translationData[3]))
-                data.append((vertIndex, translationVector))
-            return(True, np.asarray(data, dtype=dtype))
+        except ValueError:
+            values = None
+
+        if values is None or (values.size > 0 and values.shape[1] != 4):
+            try:
+                fd = open(filename, 'r', encoding='utf-8')
+            except:
+                return (False, None)
+            with fd:
+                return (True, self.loadByLine(fd, dtype))
+
+        arr = np.zeros(len(values), dtype=dtype)
+        if len(values) > 0:
+            arr['index'] = values[:,0]
+            arr['vector'] = values[:,1:]
+        return (True, arr)
+
+    def loadByLine(self, lines, dtype):
+        data = []
+        for line in lines:
+            line = line.strip()
+            if line.startswith('#'):
+                continue
+            translationData = line.split()
+            if len(translationData) != 4:
+                continue
+            vertIndex = int(translationData[0])
+            translationVector = (float(translationData[1]), float(translationData[2]), float(translationData[3]))
+            data.append((vertIndex, translationVector))
+        return(np.asarray(data, dtype=dtype))
 
     def saveCompressed(self, filename, content):
         f = open(filename, "wb")
@@ -182,23 +217,193 @@ class TargetASCII():
 
         return(result)
 
-    def loadAllTargets(self, path, verbose=0):
+    def loadAllTargets(self, path, verbose=0, previous=None, workers=None):
+        """
+        load all targets of a folder, the files are parsed in parallel processes
+
+        :param previous: dictionary name -> (mtime in ns, array) of an earlier build, targets with the same mtime are not parsed again
+        :param workers: number of processes, None = number of processors
+        :return: dictionary name -> array, dictionary name -> mtime, number of parsed files
+        """
         content = {}
+        mtimes = {}
+        toload = []
         l = len(path)
         alltargets = self.scanDir(path)
         for filename in alltargets:
-            if verbose >0:
-                print ("loading: " + filename)
-            (res, arr) = self.load(filename)
-            if res is True:
-                if filename.startswith(path):
-                    name = filename[l+1:]
-                    content[name[:-7]] = arr
-        return (content)
-
-    def compressAllTargets(self, sourcefolder, destfile, verbose=0):
-        content = self.loadAllTargets(sourcefolder, verbose)
+            if filename.startswith(path):
+                name = filename[l+1:-7]
+                mtime = os.stat(filename).st_mtime_ns
+                if previous is not None and name in previous and previous[name][0] == mtime:
+                    content[name] = previous[name][1]
+                    mtimes[name] = mtime
+                else:
+                    toload.append((name, filename, mtime))
+
+        if len(toload) > 0:
+            filenames = [elem[1] for elem in toload]
+            if workers == 1 or len(toload) == 1:
+                results = list(map(self.load, filenames))
+            else:
+                # workers are spawned, forking a process with running Qt and worker threads can copy held locks
+                #
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                    results = list(executor.map(loadTarget, filenames, chunksize=16))
+
+            for (name, filename, mtime), (res, arr) in zip(toload, results):
+                if verbose >0:
+                    print ("loaded: " + filename)
+                if res is True:
+                    content[name] = arr
+                    mtimes[name] = mtime
+
+        return (content, mtimes, len(toload))
+
+    def manifestName(self, destfile):
+        return (destfile + "-manifest.json")
+
+    def loadPrevious(self, destfile):
+        """
+        return targets of an earlier build with the modification times of their sources (from manifest)
+        """
+        try:
+            with open(self.manifestName(destfile), 'r', encoding='utf-8') as f:
+                mtimes = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        dtype = [('index','u4'),('vector','(3,)f4')]
+        previous = {}
+        if destfile.endswith(".npz"):
+            if not os.path.isfile(destfile):
+                return None
+            with np.load(destfile) as bintargets:
+                for name in bintargets.files:
+                    if name in mtimes:
+                        previous[name] = (mtimes[name], bintargets[name])
+        else:
+            store = TargetStore()
+            if not (store.exists(destfile) and store.load(destfile)):
+                return None
+            for name in store.names:
+                if name in mtimes:
+                    (start, end) = store.getTarget(name)
+                    arr = np.zeros(end - start, dtype=dtype)
+                    arr['index'] = store.index[start:end]
+                    arr['vector'] = store.vector[start:end]
+                    previous[name] = (mtimes[name], arr)
+        return (previous)
+
+    def compressAllTargets(self, sourcefolder, destfile, verbose=0, force=False, workers=None):
+        """
+        destfile ending with .npz creates the old compressed format, otherwise a TargetStore
+        only targets changed since the last build are parsed, unless force is True
+
+        :return: number of targets, number of parsed targets
+        """
+        previous = None if force else self.loadPrevious(destfile)
+        (content, mtimes, parsed) = self.loadAllTargets(sourcefolder, verbose, previous, workers)
         if verbose > 0:
-            print ("save compressed: " + destfile)
-        self.saveCompressed(destfile, content)
+            print ("targets: " + str(len(content)) + ", parsed: " + str(parsed))
+
+        if destfile.endswith(".npz"):
+            if verbose > 0:
+                print ("save compressed: " + destfile)
+            self.saveCompressed(destfile, content)
+        else:
+            if verbose > 0:
+                print ("save target store: " + destfile)
+            if not TargetStore().save(destfile, content):
+                return (len(content), parsed)
+
+        with open(self.manifestName(destfile), 'w', encoding='utf-8') as f:
+            json.dump(mtimes, f, indent=0, sort_keys=True)
+        return (len(content), parsed)
+
+class TargetStore():
+    """
+    uncompressed binary target store, arrays are memory mapped, so targets are paged in lazily
+    and shared between processes via page cache. Structure (filename is the prefix):
+
+    <filename>-names.npy    names of the targets
+    <filename>-offsets.npy  start of each target in index and vector, one more entry for the end
+    <filename>-index.npy    vertex numbers of all targets (uint32)
+    <filename>-vector.npy   translation vectors of all targets (float32, shape (n,3))
+    """
+    parts = ["names", "offsets", "index", "vector"]
+
+    def __init__(self):
+        self.names = {}     # name -> position in offsets
+        self.offsets = None
+        self.index = None
+        self.vector = None
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def partName(self, filename, part):
+        return filename + "-" + part + ".npy"
+
+    def exists(self, filename):
+        for part in self.parts:
+            if not os.path.isfile(self.partName(filename, part)):
+                return False
+        return True
+
+    def save(self, filename, content):
+        """
+        content is a dictionary of structured arrays (index, vector) like TargetASCII.load creates
+
+        all parts are written to temporary files first and replace the old files afterwards,
+        because the old files might be memory mapped by the running program
+        """
+        names = sorted(content)
+        lengths = np.asarray([len(content[name]) for name in names], dtype=np.int64)
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        index = np.zeros(offsets[-1], dtype=np.uint32)
+        vector = np.zeros((offsets[-1], 3), dtype=np.float32)
+        for i, name in enumerate(names):
+            index[offsets[i]:offsets[i+1]] = content[name]['index']
+            vector[offsets[i]:offsets[i+1]] = content[name]['vector']
+
+        arrays = {"names": np.asarray(names, dtype=np.str_), "offsets": offsets, "index": index, "vector": vector}
+        for part in self.parts:
+            with open(self.partName(filename, part) + ".tmp", "wb") as f:
+                np.save(f, arrays[part])
+        try:
+            for part in self.parts:
+                os.replace(self.partName(filename, part) + ".tmp", self.partName(filename, part))
+        except OSError as error:
+            # e.g. on Windows a memory mapped file cannot be replaced
+            print ("Cannot replace target store " + filename + ": " + str(error))
+            return False
+        return True
+
+    def load(self, filename):
+        """
+        only names and offsets are read, index and vector are memory mapped
+        """
+        try:
+            names = np.load(self.partName(filename, "names"))
+            self.offsets = np.load(self.partName(filename, "offsets"))
+            self.index = np.load(self.partName(filename, "index"), mmap_mode='r')
+            self.vector = np.load(self.partName(filename, "vector"), mmap_mode='r')
+        except (OSError, ValueError):
+            return False
+        if len(self.offsets) != len(names) + 1 or len(self.index) != self.offsets[-1]:
+            return False
+        self.names = {name: i for i, name in enumerate(names.tolist())}
+        return True
+
+    def getTarget(self, name):
+        """
+        returns start and end position of a target in index and vector
+        """
+        i = self.names[name]
+        return int(self.offsets[i]), int(self.offsets[i+1])
 
@@ -7,6 +7,9 @@ quaternionFromMatrix            Return quaternion from rotation matrix.
 quaternionMult                  Return multiplication of two quaternions.
 quaternionSlerp                 Return spherical linear interpolation between two quaternions.
 quaternionSlerpFromMatrix       do a slerp from Restmatix by ratio
+eulerMatrices                   Return rotation matrices (3x3) from arrays of euler angles.
+quaternionsFromMatrices         Return quaternions from an array of rotation matrices.
+dualQuaternionsFromMatrices     Return dual quaternions from an array of rigid transformation matrices.
 """
 
 _EPS = np.finfo(float).eps * 4.0
@@ -44,6 +47,45 @@ def eulerMatrix(x, y, z, s="xyz"):
     # zyx
     return eulerMatrixXYZ(-x, -y, -z, 2, 1, 0)
 
+def eulerMatricesXYZ(ri, rj, rk, i, j, k):
+    """
+    batched version of eulerMatrixXYZ, angles are arrays of the same shape
+    returns rotation matrices (3x3) with shape of angles + (3, 3)
+    """
+    M = np.empty(np.shape(ri) + (3, 3))
+    si, sj, sk = np.sin(ri), np.sin(rj), np.sin(rk)
+    ci, cj, ck = np.cos(ri), np.cos(rj), np.cos(rk)
+    cc, cs = ci*ck, ci*sk
+    sc, ss = si*ck, si*sk
+
+    M[..., i, i] = cj*ck
+    M[..., i, j] = sj*sc-cs
+    M[..., i, k] = sj*cc+ss
+    M[..., j, i] = cj*sk
+    M[..., j, j] = sj*ss+cc
+    M[..., j, k] = sj*cs-sc
+    M[..., k, i] = -sj
+    M[..., k, j] = cj*si
+    M[..., k, k] = cj*ci
+    return(M)
+
+def eulerMatrices(x, y, z, s="xyz"):
+    """
+    batched version of eulerMatrix, returns rotation matrices (3x3)
+    """
+    if s == "xyz":
+        return eulerMatricesXYZ(x, y, z, 0, 1, 2)
+    elif s == "xzy":
+        return eulerMatricesXYZ(-x, -y, -z, 0, 2, 1)
+    elif s == "yzx":
+        return eulerMatricesXYZ(x, y, z, 1, 2, 0)
+    elif s == "yxz":
+        return eulerMatricesXYZ(-x, -y, -z, 1, 0, 2)
+    elif s == "zxy":
+        return eulerMatricesXYZ(x, y, z, 2, 0, 1)
+    # zyx
+    return eulerMatricesXYZ(-x, -y, -z, 2, 1, 0)
+
 def quaternionToRotMatrix(quaternion):
     """
     Return homogeneous rotation matrix from quaternion.
@@ -61,6 +103,29 @@ def quaternionToRotMatrix(quaternion):
         [    q[1, 3]-q[2, 0],     q[2, 3]+q[1, 0], 1.0-q[1, 1]-q[2, 2], 0.0],
         [                0.0,                 0.0,                 0.0, 1.0]])
 
+def quaternionsToRotMatrices(q):
+    """
+    batched version of quaternionToRotMatrix, quaternions are an array (..., 4)
+    returns rotation matrices (3x3) with shape (..., 3, 3), identity for quaternions with length 0
+    """
+    q = np.array(q, dtype=np.float64, copy=True)
+    n = np.sum(q * q, axis=-1)
+    valid = n >= _EPS
+    q[valid] *= np.sqrt(2.0 / n[valid])[:,None]
+    (w, x, y, z) = (q[...,0], q[...,1], q[...,2], q[...,3])
+    m = np.empty(q.shape[:-1] + (3, 3), dtype=np.float64)
+    m[...,0,0] = 1.0 - y*y - z*z
+    m[...,0,1] = x*y - z*w
+    m[...,0,2] = x*z + y*w
+    m[...,1,0] = x*y + z*w
+    m[...,1,1] = 1.0 - x*x - z*z
+    m[...,1,2] = y*z - x*w
+    m[...,2,0] = x*z - y*w
+    m[...,2,1] = y*z + x*w
+    m[...,2,2] = 1.0 - x*x - y*y
+    m[~valid] = np.identity(3)
+    return (m)
+
 def quaternionFromMatrix(m):
     """
     Return quaternion from rotation matrix.
@@ -94,6 +159,58 @@ def quaternionFromMatrix(m):
 
     return np.asarray([qw, qx, qy, qz], dtype=np.float32)
 
+def quaternionsFromMatrices(m):
+    """
+    Return quaternions from an array of rotation matrices (n, 3, 3) or (n, 4, 4) as array (n, 4).
+    same cases as quaternionFromMatrix, selected per matrix
+    """
+    m = np.asarray(m, dtype=np.float64)
+    q = np.empty((len(m), 4), dtype=np.float64)
+    (m00, m11, m22) = (m[:,0,0], m[:,1,1], m[:,2,2])
+    tr = m00 + m11 + m22
+
+    case0 = tr > 0
+    case1 = ~case0 & (m00 > m11) & (m00 > m22)
+    case2 = ~case0 & ~case1 & (m11 > m22)
+    case3 = ~(case0 | case1 | case2)
+
+    i = case0
+    S = np.sqrt(tr[i] + 1.0) * 2
+    q[i] = np.column_stack((0.25 * S, (m[i,2,1] - m[i,1,2]) / S, (m[i,0,2] - m[i,2,0]) / S, (m[i,1,0] - m[i,0,1]) / S))
+
+    i = case1
+    S = np.sqrt(1.0 + m00[i] - m11[i] - m22[i]) * 2
+    q[i] = np.column_stack(((m[i,2,1] - m[i,1,2]) / S, 0.25 * S, (m[i,0,1] + m[i,1,0]) / S, (m[i,0,2] + m[i,2,0]) / S))
+
+    i = case2
+    S = np.sqrt(1.0 + m11[i] - m00[i] - m22[i]) * 2
+    q[i] = np.column_stack(((m[i,0,2] - m[i,2,0]) / S, (m[i,0,1] + m[i,1,0]) / S, 0.25 * S, (m[i,1,2] + m[i,2,1]) / S))
+
+    i = case3
+    S = np.sqrt(1.0 + m22[i] - m00[i] - m11[i]) * 2
+    q[i] = np.column_stack(((m[i,1,0] - m[i,0,1]) / S, (m[i,0,2] + m[i,2,0]) / S, (m[i,1,2] + m[i,2,1]) / S, 0.25 * S))
+    return (q)
+
+def dualQuaternionsFromMatrices(m):
+    """
+    Return dual quaternions from an array of rigid transformation matrices (n, 3, 4) or (n, 4, 4)
+    as array (n, 8), first 4 values are the rotation (real part), last 4 values the dual part
+
+    dual part = 0.5 * (0, translation) * rotation
+    """
+    m = np.asarray(m, dtype=np.float64)
+    dq = np.empty((len(m), 8), dtype=np.float64)
+    q = quaternionsFromMatrices(m)
+    dq[:,:4] = q
+
+    (w, x, y, z) = (q[:,0], q[:,1], q[:,2], q[:,3])
+    (tx, ty, tz) = (m[:,0,3] * 0.5, m[:,1,3] * 0.5, m[:,2,3] * 0.5)
+    dq[:,4] = -tx*x - ty*y - tz*z
+    dq[:,5] =  tx*w + ty*z - tz*y
+    dq[:,6] = -tx*z + ty*w + tz*x
+    dq[:,7] =  tx*y - ty*x + tz*w
+    return (dq)
+
 def quaternionMult(quaternion1, quaternion0):
     """
     Return multiplication of two quaternions.
@@ -105,6 +222,19 @@ def quaternionMult(quaternion1, quaternion0):
                         -x1*z0 + y1*w0 + z1*x0 + w1*y0,
                          x1*y0 - y1*x0 + z1*w0 + w1*z0], dtype=np.float64)
 
+def quaternionsMult(quaternion1, quaternion0):
+    """
+    batched version of quaternionMult, quaternions are arrays (..., 4)
+    """
+    q0 = np.asarray(quaternion0, dtype=np.float64)
+    q1 = np.asarray(quaternion1, dtype=np.float64)
+    (w0, x0, y0, z0) = (q0[...,0], q0[...,1], q0[...,2], q0[...,3])
+    (w1, x1, y1, z1) = (q1[...,0], q1[...,1], q1[...,2], q1[...,3])
+    return np.stack((-x1*x0 - y1*y0 - z1*z0 + w1*w0,
+                      x1*w0 + y1*z0 - z1*y0 + w1*x0,
+                     -x1*z0 + y1*w0 + z1*x0 + w1*y0,
+                      x1*y0 - y1*x0 + z1*w0 + w1*z0), axis=-1)
+
 
 def quaternionSlerp(quat0, quat1, fraction, shortestpath=True):
     """
@@ -149,6 +279,41 @@ def quaternionSlerp(quat0, quat1, fraction, shortestpath=True):
     q0 += q1
     return q0
 
+def quaternionsSlerp(quat0, quat1, fraction, shortestpath=True):
+    """
+    batched version of quaternionSlerp, quaternions are arrays (..., 4), fraction is a number or an array (...)
+    the trivial cases of quaternionSlerp are selected per quaternion by masks
+    """
+    fraction = np.asarray(fraction, dtype=np.float64)
+    q0 = np.asarray(quat0, dtype=np.float64)[...,:4]
+    q1 = np.asarray(quat1, dtype=np.float64)[...,:4]
+    shape = np.broadcast_shapes(q0.shape[:-1], q1.shape[:-1], fraction.shape)
+    q0 = np.broadcast_to(q0, shape + (4,))
+    q1 = np.broadcast_to(q1, shape + (4,))
+    fraction = np.broadcast_to(fraction, shape)
+
+    # dot-product, invert rotation for shortest path
+    #
+    d = np.sum(q0 * q1, axis=-1)
+    keep = np.abs(np.abs(d) - 1.0) < _EPS
+    qs = q1
+    if shortestpath:
+        flip = d < 0.0
+        d = np.abs(d)
+        qs = np.where(flip[...,None], -q1, q1)
+
+    angle = np.arccos(np.clip(d, -1.0, 1.0))
+    keep |= np.abs(angle) < _EPS
+    isin = np.ones(shape, dtype=np.float64)
+    isin[~keep] = 1.0 / np.sin(angle[~keep])
+    result = q0 * (np.sin((1.0 - fraction) * angle) * isin)[...,None] + qs * (np.sin(fraction * angle) * isin)[...,None]
+
+    # trivial cases, same order as in quaternionSlerp
+    #
+    result = np.where(keep[...,None], q0, result)
+    result = np.where((fraction == 1.0)[...,None], q1, result)
+    return (np.where((fraction == 0.0)[...,None], q0, result))
+
 
 def quaternionSlerpFromMatrix(mat, fraction, shortestpath=True):
     """
@@ -160,6 +325,14 @@ def quaternionSlerpFromMatrix(mat, fraction, shortestpath=True):
     quat1 = quaternionFromMatrix(m)
     return (quaternionSlerp(quat0, quat1, fraction, shortestpath))
 
+def quaternionsSlerpFromMatrices(mats, fraction, shortestpath=True):
+    """
+    batched version of quaternionSlerpFromMatrix, mats is an array (n, 3, 3) or (n, 4, 4)
+    fraction is a number or an array (n)
+    """
+    quat0 = np.asarray([1,0,0,0], dtype=np.float64)
+    return (quaternionsSlerp(quat0, quaternionsFromMatrices(mats), fraction, shortestpath))
+
 
 def rotMatrix(angle, direction):
     sina = math.sin(angle)
@@ -180,6 +353,57 @@ def rotMatrix(angle, direction):
     M[:3, :3] = R
     return (M)
 
+def rotMatrices(angle, direction):
+    """
+    batched version of rotMatrix, angle is an array (...), direction an array (..., 3)
+    returns homogeneous rotation matrices (..., 4, 4)
+    """
+    angle = np.asarray(angle, dtype=np.float64)
+    direction = np.asarray(direction, dtype=np.float64)[...,:3]
+    shape = np.broadcast_shapes(angle.shape, direction.shape[:-1])
+    sina = np.broadcast_to(np.sin(angle), shape)
+    cosa = np.broadcast_to(np.cos(angle), shape)
+
+    # convert direction to length of a unit vector
+    #
+    direction = direction / np.sqrt(np.sum(direction * direction, axis=-1))[...,None]
+    direction = np.broadcast_to(direction, shape + (3,))
+
+    M = np.zeros(shape + (4, 4), dtype=np.float64)
+    M[...,:3,:3] = direction[...,:,None] * direction[...,None,:] * (1.0 - cosa)[...,None,None]
+    for i in range(3):
+        M[...,i,i] += cosa
+    (x, y, z) = (direction[...,0] * sina, direction[...,1] * sina, direction[...,2] * sina)
+    M[...,0,1] -= z
+    M[...,0,2] += y
+    M[...,1,0] += z
+    M[...,1,2] -= x
+    M[...,2,0] -= y
+    M[...,2,1] += x
+    M[...,3,3] = 1.0
+    return (M)
+
+def orientationMatrix(orientation):
+    """
+    rotation matrix for an orientation used by changeOrientation, None if orientation is unknown
+    """
+    if isinstance(orientation, str):
+        oris = [ 'yUpFaceZ', 'yUpFaceX', 'zUpFaceNegY',  'zUpFaceX' ]
+        try:
+            orientation = oris.index(orientation)
+        except:
+            return None
+
+    if orientation == 0:
+        return np.identity(4, dtype=np.float32)
+    elif orientation == 1:
+        return rotMatrix(math.pi/2, (0,1,0)) # rotation in y
+    elif orientation == 2:
+        return rotMatrix(math.pi/2, (1,0,0)) # rotation in X
+    elif orientation == 3:
+        return np.dot(rotMatrix(math.pi/2, (0,0,1)), rotMatrix(math.pi/2, (1,0,0))) # dot product of Z x X
+    return None
+
 
 def changeOrientation(mat, orientation=0, rotAxis='y', offset=[0,0,0]):
     """
@@ -198,21 +422,9 @@ def changeOrientation(mat, orientation=0, rotAxis='y', offset=[0,0,0]):
     mat = mat.copy()
     mat[:3,3] += offset
 
-    if isinstance(orientation, str):
-        oris = [ 'yUpFaceZ', 'yUpFaceX', 'zUpFaceNegY',  'zUpFaceX' ]
-        try:
-            orientation = oris.index(orientation)
-        except:
-            return None
-
-    if orientation == 0:
-        rot = np.identity(4, dtype=np.float32)
-    elif orientation == 1:
-        rot =_rotMatrix(math.pi/2, (0,1,0)) # rotation in y
-    elif orientation == 2:
-        rot = rotMatrix(math.pi/2, (1,0,0)) # rotation in X
-    elif orientation == 3:
-        rot =_np.dot(rotMatrix(math.pi/2, (0,0,1)), rotMatrix(math.pi/2, (1,0,0))) # dot product of Z x X
+    rot = orientationMatrix(orientation)
+    if rot is None:
+        return None
 
     if rotAxis.lower() == 'y':
         # Y along self, X bend
@@ -228,4 +440,25 @@ def changeOrientation(mat, orientation=0, rotAxis='y', offset=[0,0,0]):
     tmat[:,3] = np.dot(rot, mat[:,3])
     return tmat
 
+def changeOrientations(mats, orientation=0, rotAxis='y', offset=[0,0,0]):
+    """
+    batched version of changeOrientation, mats is an array (n, 4, 4)
+    """
+    mats = np.array(mats, copy=True)
+    mats[:,:3,3] += offset
+
+    rot = orientationMatrix(orientation)
+    if rot is None:
+        return None
 
+    if rotAxis.lower() == 'y':
+        return rot @ mats
+
+    elif rotAxis.lower() == 'x':
+        rotxy = np.dot(rotMatrix(-math.pi/2, (1,0,0)), rotMatrix(math.pi/2, (0,1,0)))
+        return rot @ (mats @ rotxy)
+
+    # Global coordinate system
+    tmat = np.repeat(np.identity(4, float)[None], len(mats), axis=0)
+    tmat[:,:,3] = (rot @ mats[:,:,3,None])[...,0]
+    return tmat
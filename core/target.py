@@ -1,11 +1,12 @@
 from gui.common import WorkerThread
 from gui.slider import ScaleComboItem
 from core.targetcat import TargetCategories
-from core.importfiles import TargetASCII
+from core.importfiles import TargetASCII, TargetStore
 
 import os
 import sys
 import json
+from collections import OrderedDict
 import numpy as np
 
 class MacroTree:
@@ -215,58 +216,61 @@ class Modelling(ScaleComboItem):
             if factor > 0.01:
                 targetlist.append ({"name": macroname[1:], "factor": factor})
 
-    def macroCalculation(self, m_influence):
+    def macroWeights(self, l):
+        """
+        calculate the factors of all targets used by one macro definition
+        returns a dictionary target -> factor
+        """
         macros = self.glob.targetMacros
         macrodef = macros["macrodef"]
         components = macros["components"]
         targetlist = []
-        for l in m_influence:
-            print ("   " + macrodef[l]["name"])
-            comps = macrodef[l]["comp"]
-            weightarray = []
-            for elem in comps:
-                if elem in components:
-                    pattern = components[elem]["pattern"]
-                    values  = components[elem]["values"]
-                    # print ("\t\tPattern:" +  str(pattern) + " " + str(values))
-
-                    if "steps" not in components[elem]:
-
-                        # extra for sum of sliders (human phenotype)
-                        #
-                        sum = components[elem]["sum"]
-                        m = MacroTree()
-                        for i,v in enumerate(values):
-                            p = pattern +  sum[i]
-                            if p not in self.glob.targetRepo:
-                                continue
-                            current = self.glob.targetRepo[p]
-                            b = current.barycentric[i]["value"]
-                            if b > 0.001:
-                                # print ("\t\tCurrent value " + v + " " + str(b))
-                                m.insert(v, b)
-                        weightarray.append(m)
-                    else:
-                        steps = components[elem]["steps"]
-                        if pattern not in self.glob.targetRepo:
+        print ("   " + macrodef[l]["name"])
+        comps = macrodef[l]["comp"]
+        weightarray = []
+        for elem in comps:
+            if elem in components:
+                pattern = components[elem]["pattern"]
+                values  = components[elem]["values"]
+                # print ("\t\tPattern:" +  str(pattern) + " " + str(values))
+
+                if "steps" not in components[elem]:
+
+                    # extra for sum of sliders (human phenotype)
+                    #
+                    sum = components[elem]["sum"]
+                    m = MacroTree()
+                    for i,v in enumerate(values):
+                        p = pattern +  sum[i]
+                        if p not in self.glob.targetRepo:
                             continue
-                        current = self.glob.targetRepo[pattern].value / 100
-                        # print ("\t\tCurrent " + str(current) + " Divisions: " + str(len(steps)))
-
-                        for i in range(0,len(steps)-1):
-                            if current > steps[i+1]:
-                                continue
-                            else:
-                                c = (current - steps[i]) / (steps[i+1] - steps[i])
-                                m = MacroTree()
-                                if c < 0.999:
-                                    m.insert(values[i], 1-c)
-                                if c > 0.001:
-                                    m.insert(values[i+1], c)
-                                weightarray.append(m)
-                                break
-
-            self.generateAllMacroWeights(targetlist, "", 1.0, weightarray)
+                        current = self.glob.targetRepo[p]
+                        b = current.barycentric[i]["value"]
+                        if b > 0.001:
+                            # print ("\t\tCurrent value " + v + " " + str(b))
+                            m.insert(v, b)
+                    weightarray.append(m)
+                else:
+                    steps = components[elem]["steps"]
+                    if pattern not in self.glob.targetRepo:
+                        continue
+                    current = self.glob.targetRepo[pattern].value / 100
+                    # print ("\t\tCurrent " + str(current) + " Divisions: " + str(len(steps)))
+
+                    for i in range(0,len(steps)-1):
+                        if current > steps[i+1]:
+                            continue
+                        else:
+                            c = (current - steps[i]) / (steps[i+1] - steps[i])
+                            m = MacroTree()
+                            if c < 0.999:
+                                m.insert(values[i], 1-c)
+                            if c > 0.001:
+                                m.insert(values[i+1], c)
+                            weightarray.append(m)
+                            break
+
+        self.generateAllMacroWeights(targetlist, "", 1.0, weightarray)
 
         # The last step is the optimization: Some weightfiles are not existing.
         # So they would be a factor of 0. Sometimes targets are identical.
@@ -283,19 +287,38 @@ class Modelling(ScaleComboItem):
                 if name in l and l[name] is not None:
                     if l[name] in sortedtargets:
                         sortedtargets[l[name]] += elem["factor"]
-                        print(" Add: " + name)
                     else:
                         sortedtargets[l[name]] = elem["factor"]
-                        print(" New: " + name)
-                else:
-                    pass
+        return (sortedtargets)
+
+    def macroCalculation(self, m_influence):
+        """
+        the macro buffer contains the sum of all macro targets, the factors used are cached per macro definition.
+        only the macros in m_influence are calculated again, the difference of the factors is added to the buffer
+        """
+        cache = self.glob.Targets.macroweights
+        delta = {}
+        for l in m_influence:
+            new = self.macroWeights(l)
+            old = cache[l] if l in cache else {}
+            for elem in new:
+                delta[elem] = delta.get(elem, 0.0) + new[elem]
+            for elem in old:
+                delta[elem] = delta.get(elem, 0.0) - old[elem]
+            cache[l] = new
 
         # add them to screen first
         #
-        for elem in sortedtargets:
-            if elem in self.glob.macroRepo:
-                print ("  + " + str(round(sortedtargets[elem],2)) + " " + elem)
-                self.obj.baseMesh.addTargetToMacroBuffer(sortedtargets[elem], self.glob.macroRepo[elem])
+        factors = []
+        targets = []
+        for elem in delta:
+            if elem in self.glob.macroRepo and abs(delta[elem]) > 1e-7:
+                print ("  + " + str(round(delta[elem],2)) + " " + elem)
+                target = self.glob.macroRepo[elem]
+                if target.load():
+                    factors.append(delta[elem])
+                    targets.append(target)
+        self.obj.baseMesh.addTargetsToMacroBuffer(factors, targets)
         self.obj.baseMesh.addMacroBuffer()
 
     def macroCalculationLoad(self):
@@ -305,18 +328,22 @@ class Modelling(ScaleComboItem):
         #
         m_influence = list(range(0,len(m)))
         self.obj.baseMesh.prepareMacroBuffer()
+        self.glob.Targets.macroweights = {}
         self.macroCalculation(m_influence)
 
     def changeMacroTarget(self, bckproc, args):
         """
         change macros will run as a background process
+        only the macros influenced by this slider are calculated
         """
         self._last_value = self.value
 
         print (self.m_influence)
-        m = self.glob.targetMacros['macrodef']
-        m_influence = list(range(0,len(m)))
-        self.macroCalculation(m_influence)
+        if len(self.glob.Targets.macroweights) == 0:
+            m = self.glob.targetMacros['macrodef']
+            self.macroCalculation(list(range(0,len(m))))
+        else:
+            self.macroCalculation(self.m_influence)
         self.obj.updateAttachedAssets()
 
     def setBaryCentricDiffuse(self):
@@ -389,12 +416,21 @@ class Modelling(ScaleComboItem):
 class Morphtarget:
     """
     handle a single target
+    targets not taken from a TargetStore are only declared by loadTargetData, the data itself
+    is read by load() when it is needed the first time (non-zero value or a slider is touched)
     """
     def __init__(self, env, name):
         self.name = name
         self.raw  = None
         self.verts= []
         self.data = []
+        self.row  = None    # row number in MorphEngine, when packed
+        self.store = None   # TargetStore, when data is memory mapped
+        self.start = 0      # position in TargetStore
+        self.end   = 0
+        self.path = None        # path of ascii target, used by load()
+        self.bintargets = None  # npz file, used by load()
+        self.loaded = False
         self.env  = env
 
     def __str__(self):
@@ -402,37 +438,300 @@ class Morphtarget:
 
     def loadTargetData(self, path, bintargets=None):
         """
-        get Target data either from pre-loaded npz file or from single targets
+        get Target data either from a memory mapped TargetStore (always mapped, pages are read by the OS on demand)
+        or declare it to be loaded later from pre-loaded npz file or from single targets
         """
-        if bintargets is not None:
+        if isinstance(bintargets, TargetStore):
+            if self.name in bintargets:
+                self.env.logLine(8, "Use Data for " + self.name + " from target store")
+                self.store = bintargets
+                (self.start, self.end) = bintargets.getTarget(self.name)
+                self.verts = bintargets.index[self.start:self.end]
+                self.data = bintargets.vector[self.start:self.end]
+                self.loaded = True
+                return
+
+        elif bintargets is not None:
             if self.name in bintargets.files:
-                self.env.logLine(8, "Use Data for " + self.name + " from binary file")
-                self.raw = bintargets[self.name]
-                self.verts = self.raw['index']
-                self.data = self.raw['vector']
+                self.bintargets = bintargets
                 return
 
         filename = os.path.join(path, self.name) + ".target"
-        self.env.logLine(8, "Load: " + filename)
-
-        ta = TargetASCII()
-        (res, self.raw) = ta.load(filename)
-        if res is False:
+        if not os.path.isfile(filename):
             self.env.logLine(1, "Cannot load:" + filename)
             return
+        self.path = path
+
+    def load(self):
+        """
+        read the data of a declared target, returns False if nothing could be loaded
+        """
+        if self.loaded:
+            return True
+
+        if self.bintargets is not None:
+            self.env.logLine(8, "Use Data for " + self.name + " from binary file")
+            self.raw = self.bintargets[self.name]
+        elif self.path is not None:
+            filename = os.path.join(self.path, self.name) + ".target"
+            self.env.logLine(8, "Load: " + filename)
+            ta = TargetASCII()
+            (res, self.raw) = ta.load(filename)
+            if res is False:
+                self.env.logLine(1, "Cannot load:" + filename)
+                self.path = None
+                return False
+        else:
+            return False
+
         self.verts = self.raw['index']
         self.data = self.raw['vector']
+        self.loaded = True
+        return True
+
+    def unload(self):
+        """
+        evict data of a target which can be loaded again (memory mapped targets are left as they are)
+        """
+        if self.store is None and self.loaded:
+            self.verts = []
+            self.data = []
+            self.raw = None
+            self.loaded = False
 
     def releaseNumpy(self):
-        if self.raw is not None:
+        if self.raw is not None or self.row is not None or self.store is not None:
             self.verts = None
             self.raw = None
             self.data = []
+            self.row = None
+            self.store = None
+        self.bintargets = None
+        self.path = None
+        self.loaded = False
 
     def __del__(self):
         self.env.logLine(4, " -- __del__ Morphtarget: " + self.name)
 
 
+class MorphEngine:
+    """
+    all target deltas organized as one sparse matrix (targets x vertex-components)
+    row r of the matrix contains the target with target.row == r, columns are the indices of
+    the flattened gl_coord buffer, so the complete character is gl_coord_o + W @ D
+
+    rows are stored as blocks of (vertex, x, y, z) in one of the backing arrays, these are either
+    the memory mapped arrays of a TargetStore, a packed copy of targets loaded before or the arrays
+    of a single target loaded on demand. Rows not yet loaded have backing -1.
+
+    maxresident limits the number of targets loaded on demand (0 = no limit), the least
+    recently used ones without a weight are evicted
+    """
+    def __init__(self, env, maxresident=0):
+        self.env = env
+        self.maxresident = maxresident
+        self.targets = []       # rows, list of Morphtargets
+        self.backings = []      # list of (verts, data) arrays, None for unused slots
+        self.resident = OrderedDict()   # rows loaded on demand, least recently used first
+        self.rowbacking = np.zeros(0, dtype=np.int32)   # backing used per row
+        self.starts = np.zeros(0, dtype=np.int64)       # start of each row in backing
+        self.ends = np.zeros(0, dtype=np.int64)         # end of each row in backing
+        self.weights = np.zeros(0, dtype=np.float32)    # factor per row (W)
+
+    def __str__(self):
+        return ("Morph engine: " + str(len(self.targets)) + " targets, " + str(int(np.sum(self.ends - self.starts))) +
+                " vertices, " + str(len(self.resident)) + " loaded on demand, " +
+                str(len(self.backings) - self.backings.count(None)) + " backing(s)")
+
+    def addBacking(self, verts, data):
+        for i, elem in enumerate(self.backings):
+            if elem is not None and elem[0] is verts:
+                return i
+        if None in self.backings:
+            i = self.backings.index(None)
+            self.backings[i] = (verts, data)
+            return i
+        self.backings.append((verts, data))
+        return len(self.backings) - 1
+
+    def pack(self, targets):
+        """
+        create rows for all targets. Targets from a TargetStore use the memory mapped arrays,
+        loaded ones are packed into contiguous arrays. Afterwards verts and data of these
+        targets are only views into the packed arrays, so nothing is duplicated.
+        Targets not loaded get a row without backing, they are loaded by loadRows.
+        """
+        for target in self.targets:
+            target.row = None
+
+        self.targets = []
+        self.backings = []
+        self.resident = OrderedDict()
+        rows = []
+        copies = []
+        for target in targets:
+            if target is None or target.row is not None:
+                continue
+            target.row = len(self.targets)
+            self.targets.append(target)
+            if target.store is not None:
+                rows.append((self.addBacking(target.store.index, target.store.vector), target.start, target.end))
+            elif target.loaded:
+                copies.append(target)
+                rows.append(None)
+            else:
+                rows.append((-1, 0, 0))
+
+        if len(copies) > 0:
+            counts = np.asarray([len(target.verts) for target in copies], dtype=np.int64)
+            offsets = np.zeros(len(copies) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+
+            verts = np.zeros(offsets[-1], dtype=np.uint32)
+            data = np.zeros((offsets[-1], 3), dtype=np.float32)
+            b = self.addBacking(verts, data)
+            for i, target in enumerate(copies):
+                start = offsets[i]
+                end = offsets[i+1]
+                if end > start:
+                    verts[start:end] = target.verts
+                    data[start:end] = np.reshape(target.data, (-1, 3))
+                target.verts = verts[start:end]
+                target.data = data[start:end]
+                target.raw = None
+                rows[target.row] = (b, start, end)
+
+        rows = np.asarray(rows, dtype=np.int64).reshape(-1, 3)
+        self.rowbacking = rows[:,0].astype(np.int32)
+        self.starts = rows[:,1]
+        self.ends = rows[:,2]
+        self.weights = np.zeros(len(self.targets), dtype=np.float32)
+        self.env.logLine(8, str(self))
+
+    def loadRows(self, rows):
+        """
+        make sure the data of the rows is in memory, marks them as recently used
+        """
+        for r in rows:
+            r = int(r)
+            if self.rowbacking[r] < 0:
+                target = self.targets[r]
+                if not target.load():
+                    continue
+                self.rowbacking[r] = self.addBacking(target.verts, target.data)
+                self.starts[r] = 0
+                self.ends[r] = len(target.verts)
+                self.resident[r] = True
+            elif r in self.resident:
+                self.resident.move_to_end(r)
+
+        if self.maxresident > 0 and len(self.resident) > self.maxresident:
+            self.evict(len(self.resident) - self.maxresident, rows)
+
+    def evict(self, count, keep=None):
+        """
+        evict count targets loaded on demand, least recently used first. Rows with weight
+        or mentioned in keep stay in memory
+        """
+        keep = set() if keep is None else set(int(r) for r in keep)
+        for r in list(self.resident):
+            if count <= 0:
+                break
+            if self.weights[r] != 0.0 or r in keep:
+                continue
+            self.env.logLine(8, "Evict target " + self.targets[r].name)
+            self.backings[self.rowbacking[r]] = None
+            self.rowbacking[r] = -1
+            self.starts[r] = 0
+            self.ends[r] = 0
+            self.targets[r].unload()
+            del self.resident[r]
+            count -= 1
+
+    def getRow(self, target):
+        """
+        return columns and values of one target (a row of the matrix)
+        """
+        if target.row is None:
+            target.load()
+            verts = target.verts
+            data = target.data
+        else:
+            r = target.row
+            self.loadRows([r])
+            if self.rowbacking[r] < 0:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            (verts, data) = self.backings[self.rowbacking[r]]
+            verts = verts[self.starts[r]:self.ends[r]]
+            data = data[self.starts[r]:self.ends[r]]
+
+        # numpy: column index for x, y, z of each vertex
+        # for i, v in enumerate(verts):
+        #    cols[i*3:i*3+3] = [v*3, v*3+1, v*3+2]
+        #
+        cols = (np.asarray(verts, dtype=np.int64)[:, None] * 3 + np.arange(3)).ravel()
+        return cols, np.ravel(data)
+
+    def setWeightsFromModelling(self, modelling_targets):
+        """
+        create weight vector W from the slider values of all non-macro targets
+        """
+        self.weights[:] = 0.0
+        for target in modelling_targets:
+            if target.value == 0.0 or target.macro is not None:
+                continue
+            factor = target.value / 100
+            if factor < 0.0:
+                if target.decr is not None and target.decr.row is not None:
+                    self.weights[target.decr.row] = -factor
+            elif target.incr is not None and target.incr.row is not None:
+                self.weights[target.incr.row] = factor
+
+    def apply(self, source, dest):
+        """
+        dest = source + W @ D, only rows with a weight are used
+        """
+        delta = None
+        weighted = np.flatnonzero(self.weights)
+        self.loadRows(weighted)
+        for b in np.unique(self.rowbacking[weighted]):
+            if b < 0:
+                continue
+            (verts, data) = self.backings[b]
+            rows = weighted[self.rowbacking[weighted] == b]
+
+            # numpy: gather the entries of all used rows
+            # for r in rows:
+            #    used += range(starts[r], ends[r])
+            #
+            counts = self.ends[rows] - self.starts[rows]
+            offsets = np.cumsum(counts) - counts
+            used = np.repeat(self.starts[rows] - offsets, counts) + np.arange(counts.sum())
+            w = np.repeat(self.weights[rows], counts)
+
+            cols = (verts[used].astype(np.int64)[:, None] * 3 + np.arange(3)).ravel()
+            vals = (data[used] * w[:, None]).ravel()
+            d = np.bincount(cols, weights=vals, minlength=len(source))
+            delta = d if delta is None else delta + d
+
+        if delta is None:
+            dest[:] = source
+        else:
+            np.add(source, delta, out=dest, casting="unsafe")
+
+    def axpy(self, dest, source, target, factor):
+        """
+        incremental update of one slider: dest = source + factor * D[row]
+        """
+        cols, vals = self.getRow(target)
+        dest[cols] = source[cols] + vals * factor
+
+    def release(self):
+        for target in self.targets:
+            target.releaseNumpy()
+        self.pack([])
+
+
 class Targets:
     def __init__(self, glob):
         self.glob =glob
@@ -443,6 +742,8 @@ class Targets:
         self.macrodef = None
         self.baseClass = glob.baseClass
         self.symmetry = False
+        self.engine = MorphEngine(self.env, self.env.config.get("resident_targets", 0))
+        self.macroweights = {}  # macro definition -> factors of targets used in macro buffer
 
     def __str__(self):
         return ("Target-Collection: " + str(self.collection))
@@ -525,11 +826,16 @@ class Targets:
             self.env.logLine(1, self.env.last_error )
             return
        
-        # load binary targets
+        # load binary targets, memory mapped target store is preferred, otherwise old compressed file
         #
         for x in target_env:
+            store = TargetStore()
+            storename = os.path.join(x["targetpath"], "compiledtargets")
             bintargets = os.path.join(x["targetpath"], "compressedtargets.npz")
-            if os.path.exists(bintargets):
+            if store.exists(storename) and store.load(storename):
+                self.env.logLine(8, "Map target store: " + storename)
+                x["targets"] = store
+            elif os.path.exists(bintargets):
                 self.env.logLine(8, "Load binary targets: " + bintargets)
                 x["targets"] = np.load(bintargets)
 
@@ -566,27 +872,44 @@ class Targets:
                     self.glob.targetRepo[pattern] = m
             self.modelling_targets.append(m)
 
+        # pack all non-macro targets to the sparse matrix
+        #
+        packed = []
+        for m in self.modelling_targets:
+            if m.macro is None:
+                packed.extend([m.decr, m.incr])
+        self.engine.pack(packed)
+
     def saveBinaryTargets(self, bckproc, *args):
         """
-        save targets as compressed binary (running as background command)
+        save targets as memory mapped target store (running as background command)
         :parm bck_proc: unused pointer to background process
         :param args: [0][0] 1 = system, 2 = user (3 is both)
         """
         # need to load all targets again
         #
         # TODO; check files ... refresh targets
+        # only targets changed since last compilation are parsed (in parallel processes)
     
         sys_user = args[0][0]
         ta = TargetASCII()
+        cnt = 0
+        parsed = 0
         if sys_user & 1:
             sourcefolder = self.env.stdSysPath("target")
-            destfile = self.env.stdSysPath("target", "compressedtargets.npz")
-            ta.compressAllTargets(sourcefolder, destfile)
+            destfile = self.env.stdSysPath("target", "compiledtargets")
+            (c, p) = ta.compressAllTargets(sourcefolder, destfile)
+            cnt += c
+            parsed += p
 
         if sys_user & 2:
             sourcefolder = self.env.stdUserPath("target")
-            destfile = self.env.stdUserPath("target", "compressedtargets.npz")
-            ta.compressAllTargets(sourcefolder, destfile)
+            destfile = self.env.stdUserPath("target", "compiledtargets")
+            (c, p) = ta.compressAllTargets(sourcefolder, destfile)
+            cnt += c
+            parsed += p
+
+        bckproc.finishmsg += "\nTargets: " + str(cnt) + ", parsed: " + str(parsed)
 
     def reset(self, colors=False):
         for target in self.modelling_targets:
@@ -628,6 +951,7 @@ class Targets:
                 m.incr.releaseNumpy()
             if m.decr:
                 m.decr.releaseNumpy()
+        self.engine.release()
 
         self.modelling_targets = []
 
@@ -18,10 +18,11 @@ from gui.renderer import Renderer
 from gui.common import DialogBox, ErrorBox, WorkerThread, MHBusyWindow, MHGroupBox, IconButton, TextBox, MHFileRequest
 from gui.qtreeselect import MHTreeView
 from core.baseobj import baseClass
-from core.attached_asset import attachedAsset
+from core.asset_compiler import MeshCompiler
 from opengl.info import GLDebug
 
 import os
+import time
 
 class MHMainWindow(QMainWindow):
     """
@@ -863,36 +864,39 @@ class MHMainWindow(QMainWindow):
         force = args[0][1]
         bc = self.glob.baseClass
 
-        # first compress base itself
+        # first compress base itself, on Windows the loaded (memory mapped) base cannot be replaced,
+        # the error is reported and the assets are compiled anyway
         #
+        errors = []
         syspath =  bc.baseMesh.filename.startswith(self.env.path_sysdata)
         if syspath == system:
             (okay, err) = bc.baseMesh.exportBinary()
             if not okay:
-                bckproc.finishmsg = err
-                return
+                errors.append(err)
 
-        elems_compressed = 0
-        elems_untouched = 0
+        # assets are compiled in parallel processes, unchanged assets are skipped (hashes in manifest)
+        #
+        jobs = []
         for elem in self.glob.cachedInfo:
-
             if elem.folder in ["clothes", "eyebrows", "eyelashes", "eyes", "hair", "proxy", "teeth", "tongue"]:
                 syspath = elem.path.startswith(self.env.path_sysdata)
                 if syspath == system:
-                    okay = False
-                    if force or self.env.isSourceFileNewer(elem.mhbin_file, elem.path):
-                        self.prog_window.setLabelText(elem.folder + ": create binary " + os.path.split(elem.path)[1])
-
-                        attach = attachedAsset(self.glob, elem.folder)
-                        (okay, err) = attach.mhcloToMHBin(elem.path)
-                        if not okay:
-                            bckproc.finishmsg = err
-                            return
-                        elems_compressed += 1
-                    else:
-                        elems_untouched += 1
-
-        bckproc.finishmsg = "Binaries created: " + str(elems_compressed) + "\nEntries up-to-date before: " + str(elems_untouched)
+                    jobs.append((elem.folder, elem.path))
+
+        self.prog_window.setLabelText("create binaries ...")
+        path = self.env.path_sysdata if system else self.env.path_userdata
+        manifest = os.path.join(path, "mhbin-" + self.env.basename + "-manifest.json")
+        compiler = MeshCompiler(self.env.basename, bc.baseMesh.n_origverts)
+        start = time.time()
+        (elems_compressed, elems_untouched, compileerrors) = compiler.compile(jobs, manifest, force,
+                callback=lambda path, okay, err, seconds: self.prog_window.setLabelText(
+                    "create binary " + os.path.split(path)[1] + (" (%.2f sec)" % seconds)))
+
+        bckproc.finishmsg = "Binaries created: " + str(elems_compressed) + "\nEntries up-to-date before: " + str(elems_untouched) + \
+                "\nTime: %.2f seconds" % (time.time() - start)
+        errors.extend(compileerrors)
+        if len(errors) > 0:
+            bckproc.finishmsg += "\nErrors: " + str(len(errors)) + "\n" + errors[0]
         return
 
     def compressObjsWorker(self, system, force):
@@ -84,6 +84,17 @@ class AnimPlayer(QVBoxLayout):
             self.speedSlider.setSliderValue(self.speedValue)
             vlayout.addWidget(self.speedSlider )
 
+        self.dualQuat = QCheckBox("dual quaternion skinning")
+        self.dualQuat.setLayoutDirection(Qt.LeftToRight)
+        self.dualQuat.setChecked(self.bc.skinning == "dualquaternion")
+        self.dualQuat.toggled.connect(self.changeSkinning)
+        vlayout.addWidget(self.dualQuat)
+
+        self.bakeAnim = QCheckBox("precalculate frames (cache)")
+        self.bakeAnim.setLayoutDirection(Qt.LeftToRight)
+        self.bakeAnim.toggled.connect(self.changeBake)
+        vlayout.addWidget(self.bakeAnim)
+
         gb.setLayout(vlayout)
         layout.addWidget(gb)
 
@@ -113,6 +124,7 @@ class AnimPlayer(QVBoxLayout):
     def enter(self):
         self.loopbutton.setChecked(False)
         self.rotSkyBox.setChecked(False)
+        self.bakeAnim.setChecked(False)
         self.view.addSkeleton(True)
         self.view.setRotSkyBox(False)
         self.bc.pose_skeleton.newGeometry()
@@ -123,6 +135,7 @@ class AnimPlayer(QVBoxLayout):
     def leave(self):
         self.view.stopTimer()
         self.view.stopRotate()
+        self.bc.dropAnimationCache()
         self.view.setYRotation()        # reset to 0.0
         self.firstframe()
         self.mesh.resetFromCopy()
@@ -133,6 +146,18 @@ class AnimPlayer(QVBoxLayout):
     def changeRotSkyBox(self, param):
         self.view.setRotSkyBox(param)
 
+    def changeSkinning(self, param):
+        self.bc.setSkinning("dualquaternion" if param else "linear")
+        if self.bakeAnim.isChecked():
+            self.bc.bakeAnimation()
+        self.view.Tweak()
+
+    def changeBake(self, param):
+        if param:
+            self.bc.bakeAnimation()
+        else:
+            self.bc.dropAnimationCache()
+
     def setFrame(self, value):
         if self.anim is None:
             print ("No file loaded")
@@ -379,7 +404,7 @@ class AnimExpressionEdit():
         for elem in self.expressions:
             if elem.value != 0.0:
                 print (elem.name + " is changed")
-                blends.append([elem.mat, elem.value])
+                blends.append([elem.name, elem.value])
         self.baseClass.pose_skeleton.posebyBlends(blends, None)
         self.view.Tweak()
 
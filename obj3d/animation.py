@@ -14,6 +14,7 @@ class BVHJoint():
         # which channels are used, will contain index [-1, -1, -1, 0, 1, 2] = Xrotation, Yrotation, Zrotation
         #
         self.channelorder = [-1,-1,-1,-1,-1,-1]
+        self.rotorder = "XYZ"   # order of rotation as in file, missing rotation channels appended
 
         # offset
         #
@@ -63,6 +64,15 @@ class BVH():
         self.dislocation = False        # allow dislocation of bones (usually only root can be moved), also face has no dislocation
         self.z_up = True                # read in different direction
 
+        # streaming mode for long animations: only byte offsets of the frames are kept, the frames are decoded
+        # in windows into a ring buffer (frame num uses row num % ringsize)
+        #
+        self.offsets = None             # byte offset of each frame line in streaming mode, otherwise None
+        self.ringsize = 256             # frames in ring buffer
+        self.window = 64                # frames decoded in one step
+        self.ringframes = None          # frame number stored in each row of ring buffer
+        self.channels = 0               # number of values per frame
+
     def keyParam(self, key, fp):
         param = fp.readline().split()
         if param[0] != key:
@@ -92,14 +102,17 @@ class BVH():
 
         for cnt, channel in enumerate(param[1:]):
             if channel in self.channelname:
+                if joint.channelorder[self.channelname[channel]] >= 0:
+                    self.env.last_error = "BVH-File: channel " + channel + " used twice"
+                    return False
                 joint.channelorder[self.channelname[channel]] = cnt
         joint.nChannels = nChannels
 
-        # TODO atm only lxyz-rxyz  and rxyz are allowed, the channel order determines the order of rotation 
+        # the order of the rotation channels determines the order of rotation, any subset of channels is allowed
+        # missing rotations are appended (angle is 0)
         #
-        if joint.channelorder != [0, 1, 2, 3, 4, 5] and joint.channelorder != [-1, -1, -1, 0, 1, 2] :
-            self.env.last_error = "BVH-File: channel order not yet supported"
-            return False
+        rotations = [channel[0] for channel in param[1:] if channel in ["Xrotation", "Yrotation", "Zrotation"]]
+        joint.rotorder = "".join(rotations + [axis for axis in "XYZ" if axis not in rotations])
         return True
 
     def getOffset(self, param):
@@ -153,40 +166,220 @@ class BVH():
 
         return True
 
-    def initFrames(self):
-        for joint in self.bvhJointOrder:
-            joint.animdata = np.zeros(shape=(self.frameCount, 6), dtype=np.float32)
-            joint.matrixPoses = np.zeros((self.frameCount,3,4), dtype=np.float32)
-            joint.matrixPoses[:,:3,:3] = np.identity(3, dtype=np.float32)
-
-
-    def calcLocRotMat(self, frame, data):
+    def initFrames(self, rows):
+        """
+        animation data and matrices of all joints are stored in one array, the joints use views
+        rows is the number of frames or the size of the ring buffer in streaming mode
+        """
+        n = len(self.bvhJointOrder)
+        self.animdata = np.zeros((rows, n, 6), dtype=np.float32)
+        self.matrixPoses = np.zeros((rows, n, 3, 4), dtype=np.float32)
+        self.matrixPoses[:,:,:3,:3] = np.identity(3, dtype=np.float32)
+        for num, joint in enumerate(self.bvhJointOrder):
+            joint.animdata = self.animdata[:, num]
+            joint.matrixPoses = self.matrixPoses[:, num]
+
+    def rotationTable(self, rotorder):
+        """
+        parameters for core.math.eulerMatrices for a rotation order of the file
+
+        the file rotates with R = R1(a1) * R2(a2) * R3(a3), eulerMatrices(b1, b2, b3, s) is R_s3(b3) * R_s2(b2) * R_s1(b1)
+        so the order is reversed. In case of z_up the Y axis of the file is -z, the Z axis is y
+
+        :return: order for eulerMatrices, column (0 = X, 1 = Y, 2 = Z) and sign of the angle for each parameter
+        """
+        if self.z_up:
+            axismap = {"X": ("x", 1.0), "Y": ("z", -1.0), "Z": ("y", 1.0)}
+        else:
+            axismap = {"X": ("x", 1.0), "Y": ("y", 1.0), "Z": ("z", 1.0)}
+        order = ""
+        columns = []
+        signs = []
+        for axis in reversed(rotorder):
+            (internal, sign) = axismap[axis]
+            order += internal
+            columns.append("XYZ".index(axis))
+            signs.append(sign)
+        return (order, columns, signs)
+
+    def calcLocRotMat(self, data, rows=None, store=True):
+        """
+        calculate all frames in one step, data is an array (frames, channels)
+        joints are grouped by order of rotation, each group is calculated in one step
+
+        :param rows: rows in ring buffer for streaming mode, None = data contains all frames
+        :param store: False = matrices are only returned, animdata and matrixPoses are not changed
+        :return: location/rotation matrices as array (frames, joints, 3, 4)
+        """
+        if rows is None and store:
+            (animdata, matrixPoses) = (self.animdata, self.matrixPoses)
+        else:
+            animdata = np.zeros((len(data),) + self.animdata.shape[1:], dtype=np.float32)
+            matrixPoses = np.zeros((len(data),) + self.matrixPoses.shape[1:], dtype=np.float32)
+            matrixPoses[:,:,:3,:3] = np.identity(3, dtype=np.float32)
+
+        # numpy: create index of joints, position in animdata and column in data
+        # for joint in self.bvhJointOrder:
+        #    for j, m in enumerate(joint.channelorder):
+        #        joint.animdata[frame, j] = data[i+m]
         #
-        # works only for YZX joint order (rotation)
+        jindex = []
+        slots = []
+        columns = []
         i = 0
-        order = "yzx"       # original yzx 
-        for joint in self.bvhJointOrder:
+        for num, joint in enumerate(self.bvhJointOrder):
             if joint.nChannels > 0:
                 for j, m in enumerate(joint.channelorder):
-                    if m>=0:
-                        r = data[i+m]
-                        if -0.0001 < r < 0.0001:
-                            r = 0.0
-                        joint.animdata[frame, j ] = r
+                    if m >= 0:
+                        jindex.append(num)
+                        slots.append(j)
+                        columns.append(i+m)
                 i += joint.nChannels
-                x = self.pi_mult * joint.animdata[frame, 3]
-                #
-                if self.z_up:
-                    y = -self.pi_mult * joint.animdata[frame, 4]
-                else:
-                    y = self.pi_mult * joint.animdata[frame, 4]
-                z = self.pi_mult * joint.animdata[frame, 5]
 
-                joint.matrixPoses[frame,:3,:3] = mquat.eulerMatrix(z, y, x, order)[:3,:3]
-                #
-                if joint.parent is None or self.dislocation:
-                    joint.matrixPoses[frame,:3,3] = [joint.animdata[frame, 0], joint.animdata[frame, 1], joint.animdata[frame, 2]]
+        values = data[:, columns]
+        values[np.abs(values) < 0.0001] = 0.0
+        animdata[:, jindex, slots] = values
 
+        # rotation matrices for all joints with the same order and all frames in one step
+        # (XYZ with z_up results in yzx)
+        #
+        rotated = [num for num, joint in enumerate(self.bvhJointOrder) if joint.nChannels > 0]
+        groups = {}
+        for num in rotated:
+            groups.setdefault(self.bvhJointOrder[num].rotorder, []).append(num)
+
+        for rotorder, group in groups.items():
+            (order, columns, signs) = self.rotationTable(rotorder)
+            angles = self.pi_mult * animdata[:, group, 3:6].astype(np.float64)
+            (a1, a2, a3) = [angles[:,:,c] if sign > 0 else -angles[:,:,c] for c, sign in zip(columns, signs)]
+            matrixPoses[:, group, :3, :3] = mquat.eulerMatrices(a1, a2, a3, order)
+
+        located = [num for num in rotated if self.bvhJointOrder[num].parent is None or self.dislocation]
+        matrixPoses[:, located, :3, 3:4] = animdata[:, located, :3, None]
+
+        if rows is not None and store:
+            self.animdata[rows] = animdata
+            self.matrixPoses[rows] = matrixPoses
+        return (matrixPoses)
+
+    def indexFrames(self, start):
+        """
+        streaming mode: byte offsets of all frame lines, the file is read in blocks
+        empty lines or lines containing only whitespace are skipped
+
+        :param start: byte offset of first frame
+        :return: array with frameCount + 1 offsets (last one is end of last frame) or None, if frames are missing
+        """
+        starts = []
+        ends = []
+        found = 0
+        pos = start
+        linestart = start       # offset of the line not yet terminated by a linefeed
+        content = False         # this line contains characters other than whitespace
+        with open(self.filename, "rb") as fp:
+            fp.seek(start)
+            while found < self.frameCount:
+                block = np.frombuffer(fp.read(1 << 24), dtype=np.uint8)
+                if len(block) == 0:
+                    break
+
+                # numpy: a line is used, when the number of visible characters changes up to its linefeed
+                # for line in block.split(b"\n"):
+                #    if len(line.strip()) > 0:
+                #        ...
+                #
+                linefeeds = np.flatnonzero(block == 10)
+                visible = np.cumsum(block > 32)
+                counts = visible[linefeeds]
+                used = counts > np.concatenate(([0], counts[:-1]))
+                if len(linefeeds) > 0:
+                    used[0] |= content
+                    starts.append(np.concatenate(([linestart], linefeeds[:-1] + (pos + 1)))[used])
+                    ends.append(linefeeds[used] + (pos + 1))
+                    found += np.count_nonzero(used)
+                    linestart = pos + linefeeds[-1] + 1
+                    content = bool(visible[-1] > counts[-1])
+                else:
+                    content = content or bool(visible[-1] > 0)
+                pos += len(block)
+
+        if found < self.frameCount and content:
+            starts.append([linestart])      # last line without linefeed
+            ends.append([pos])
+            found += 1
+        if found < self.frameCount:
+            return None
+        starts = np.concatenate(starts).astype(np.int64)
+        ends = np.concatenate(ends).astype(np.int64)
+        return (np.append(starts[:self.frameCount], ends[self.frameCount-1]))
+
+    def readFrames(self, start, end):
+        """
+        streaming mode: read frames start ... end-1, missing values of damaged frames are zero
+
+        :return: array (frames, channels)
+        """
+        with open(self.filename, "rb") as fp:
+            fp.seek(self.offsets[start])
+            text = fp.read(self.offsets[end] - self.offsets[start]).decode("utf-8")
+
+        count = end - start
+        data = np.fromstring(text, dtype=np.float64, sep=' ')
+        if data.size < count * self.channels:
+            self.env.logLine(1, "BVH-File: " + self.filename + " frames " + str(start) + " - " + str(end-1) + " damaged")
+            full = np.zeros(count * self.channels)
+            full[:data.size] = data
+            data = full
+        return (data[:count * self.channels].reshape(count, self.channels))
+
+    def decodeFrames(self, start, end):
+        """
+        streaming mode: read and calculate frames start ... end-1 into the ring buffer
+        """
+        rows = np.arange(start, end) % self.ringsize
+        self.calcLocRotMat(self.readFrames(start, end), rows)
+        self.ringframes[rows] = np.arange(start, end)
+
+    def frameMatrices(self, start, end):
+        """
+        location/rotation matrices of frames start ... end-1 as dictionary joint name: array (frames, 3, 4)
+        in streaming mode the frames are decoded without using the ring buffer, so a background thread
+        does not change the frames used for playback
+        """
+        if self.offsets is None:
+            matrixPoses = self.matrixPoses[start:end]
+        else:
+            matrixPoses = self.calcLocRotMat(self.readFrames(start, end), store=False)
+        return ({joint.name: matrixPoses[:, num] for num, joint in enumerate(self.bvhJointOrder) if joint.name is not None})
+
+    def frameRange(self, start, end):
+        """
+        rows of frames start ... end-1 in animdata and matrixPoses
+        in streaming mode missing frames are decoded, so the range must fit into the ring buffer
+        """
+        frames = np.arange(start, end)
+        if self.offsets is None:
+            return (frames)
+
+        rows = frames % self.ringsize
+        missing = frames[self.ringframes[rows] != frames]
+        if len(missing) > 0:
+            self.decodeFrames(missing[0], missing[-1] + 1)
+        return (rows)
+
+    def frame(self, num):
+        """
+        row of frame num in animdata and matrixPoses
+        in streaming mode a window around num is decoded (mostly frames after num for playback)
+        """
+        if self.offsets is None:
+            return num
+
+        row = num % self.ringsize
+        if self.ringframes[row] != num:
+            start = max(0, num - self.window // 4)
+            self.frameRange(start, min(self.frameCount, start + self.window))
+        return (row)
 
     def debugChanged(self):
         np.set_printoptions(precision=3, suppress=True)
@@ -194,7 +387,7 @@ class BVH():
         restmatrix[:3,:3] = np.identity(3, dtype=np.float32)
         print ("Frame: " + str(self.currentFrame))
         for joint in self.bvhJointOrder:
-            m = np.round(joint.matrixPoses[self.currentFrame], decimals=3)
+            m = np.round(joint.matrixPoses[self.frame(self.currentFrame)], decimals=3)
             if not np.array_equiv(m,restmatrix):
                 if np.where(~m.any(axis=0))[0] == 3:
                     s = list(m[:3,:3].flatten())
@@ -218,7 +411,12 @@ class BVH():
         for joint in self.bvhJointOrder:
             joint.calculateRestMat()
 
-    def load(self, filename):
+    def load(self, filename, stream=None):
+        """
+        load animation, long animations are streamed (only the byte offsets of the frames are kept)
+
+        :param stream: True/False to force mode, None = stream when all frames need more memory than configured
+        """
         self.filename = filename
         self.env.logLine(8, "Load pose " + filename)
 
@@ -253,12 +451,32 @@ class BVH():
                 return False
             self.frameTime = float(param[1])
 
-            self.initFrames()
+            channels = self.channels = sum([joint.nChannels for joint in self.bvhJointOrder])
+            if stream is None:
+                framesize = len(self.bvhJointOrder) * (6 + 12) * 4
+                stream = self.frameCount * framesize > self.env.config.get("bvh_stream_limit", 256) * 1024 * 1024
+
+            if stream and self.frameCount > self.ringsize:
+                # index of frames, the position of a text file is the byte offset at the beginning of a line
+                #
+                self.offsets = self.indexFrames(fp.tell())
+                if self.offsets is None:
+                    self.env.last_error = "BVH-File: " + str(self.frameCount) + " frames expected"
+                    return False
+                self.ringframes = np.full(self.ringsize, -1, dtype=np.int64)
+                self.initFrames(self.ringsize)
+                self.env.logLine(8, "Streaming " + str(self.frameCount) + " frames")
+                return True
 
-            for i in range(self.frameCount):
-                words = fp.readline().split()
-                data = [float(word) for word in words]
-                self.calcLocRotMat(i, data)
+            self.initFrames(self.frameCount)
+
+            # read all frames in one step
+            #
+            data = np.fromstring(fp.read(), dtype=np.float64, sep=' ')
+            if data.size < self.frameCount * channels:
+                self.env.last_error = "BVH-File: " + str(self.frameCount) + " frames expected"
+                return False
+            self.calcLocRotMat(data[:self.frameCount * channels].reshape(self.frameCount, channels))
 
         # self.debugJoints("lowerarm02.L")
         return True
@@ -289,8 +507,7 @@ class MHPose():
             self.poses[elem] = weight
             if elem in self.units:
                 if "bones" in self.units[elem]:
-                    m = self.units[elem]["bones"]
-                    self.blends.append([m, weight * 100])
+                    self.blends.append([elem, weight * 100])
 
         for elem in ("name", "author", "description", "tags", "license"):
             if elem in pose:
@@ -313,6 +530,13 @@ class FaceUnits():
         self.groups   = []
         self.bonemask = []
 
+        # precalculated quaternions of all face units for the bones of bonemask,
+        # bones not used by a unit contain the identity quaternion
+        #
+        self.unitindex = {}         # name of face unit: row in quaternions
+        self.quaternions = None     # array (units, bones, 4)
+        self.unitbones = None       # bool array (units, bones), bone used by face unit
+
     def __str__(self):
         return(str(self.units.keys()))
 
@@ -346,5 +570,53 @@ class FaceUnits():
                     if bone not in self.bonemask:
                         self.bonemask.append(bone)
         self.units = faceunits
+        self.calcQuaternions()
         return (True, "Okay")
 
+    def calcQuaternions(self):
+        """
+        convert the matrices of all face units to quaternions in one step
+        """
+        names = [elem for elem in self.units if "bones" in self.units[elem]]
+        self.unitindex = {name: num for num, name in enumerate(names)}
+        bonenum = {bone: num for num, bone in enumerate(self.bonemask)}
+        self.quaternions = np.zeros((len(names), len(self.bonemask), 4), dtype=np.float64)
+        self.quaternions[:,:,0] = 1.0
+        self.unitbones = np.zeros((len(names), len(self.bonemask)), dtype=bool)
+
+        units = []
+        bones = []
+        mats = []
+        for name in names:
+            for bone, mat in self.units[name]["bones"].items():
+                units.append(self.unitindex[name])
+                bones.append(bonenum[bone])
+                mats.append(mat)
+        if len(mats) > 0:
+            self.quaternions[units, bones] = mquat.quaternionsFromMatrices(np.asarray(mats))
+            self.unitbones[units, bones] = True
+
+    def blendQuaternions(self, names, ratios):
+        """
+        quaternions of bonemask for weighted face units, slerp from identity for all units and bones in one step,
+        then the results are multiplied in order of the units
+
+        :param names: names of face units
+        :param ratios: weights (1.0 = full pose) as array (units) or (variants, units)
+        :return: quaternions as array (bones, 4) or (variants, bones, 4), bool array of bones used by the units
+        """
+        units = [self.unitindex[name] for name in names]
+        ratios = np.asarray(ratios, dtype=np.float64)
+        identity = np.asarray([1.0, 0.0, 0.0, 0.0])
+        q = mquat.quaternionsSlerp(identity, self.quaternions[units], ratios[...,None])
+
+        # numpy: product per bone, the loop only runs over the units
+        # for bone in bones:
+        #    for unit in units:
+        #        q1 = quaternionMult(q1, q[unit, bone])
+        #
+        result = q[...,0,:,:]
+        for i in range(1, len(units)):
+            result = mquat.quaternionsMult(result, q[...,i,:,:])
+        return (result, np.any(self.unitbones[units], axis=0))
+
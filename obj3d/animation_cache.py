@@ -0,0 +1,164 @@
+"""
+precalculated animation for playback
+
+the bone matrices of the frames fitting into the cache are calculated in chunks, then skinned positions and normals
+of the meshes, both in a background thread. The frames are kept in a cache limited by a memory budget,
+the least recently used frames are removed first
+"""
+import threading
+from collections import OrderedDict
+import numpy as np
+from obj3d.bone import skinTable
+
+class AnimationCache():
+    def __init__(self, glob, skeleton, bvh, budget):
+        """
+        :param skeleton: pose skeleton (with valid forward kinematics, see skeleton.getFKSolver)
+        :param bvh: animation
+        :param budget: memory budget in megabytes
+        """
+        self.glob = glob
+        self.env = glob.env
+        self.skeleton = skeleton
+        self.bvh = bvh
+        self.budget = budget * 1024 * 1024
+        self.frames = OrderedDict()     # frame number: list of (coords, normals) per mesh
+        self.size = 0                   # used memory of frames
+        self.lock = threading.Lock()
+        self.stopped = False
+        fk = skeleton.getFKSolver()
+
+        # meshes with own skin tables (buffers are used by the background thread),
+        # assets without weights are approximated to the base mesh during playback
+        #
+        baseclass = glob.baseClass
+        self.meshes = [(baseclass.baseMesh, skeleton.bWeights)]
+        self.approximated = []
+        for asset in baseclass.attachedAssets:
+            if asset.bWeights is not None:
+                self.meshes.append((asset.obj, asset.bWeights))
+            else:
+                self.approximated.append(asset)
+
+        self.tables = []
+        self.framesize = 0
+        for (mesh, bWeights) in self.meshes:
+            table = skinTable(bWeights.bWeights, mesh.n_origverts)
+            index = np.asarray([fk.index[name] for name in table.bones], dtype=np.int64)
+            self.tables.append((table, index))
+            self.framesize += (len(mesh.gl_coord) + len(mesh.gl_norm)) * 4
+
+        # global pose matrices and pose verts matrices (4x4 float32) of all bones are part of each frame
+        #
+        self.framesize += 2 * len(fk.names) * 64
+
+        # frames in order of playback starting with current frame, only as many as fit into memory budget
+        #
+        self.start = bvh.currentFrame
+        self.count = self.capacity()
+
+        # bone matrices of these frames, calculated by the background thread (see calcMatrices)
+        #
+        shape = (self.count, len(fk.names), 4, 4)
+        self.globalmats = np.empty(shape, dtype=np.float32)
+        self.poseverts = np.empty(shape, dtype=np.float32)
+        self.computed = 0               # number of frames with bone matrices
+
+    def __str__(self):
+        return ("Animation cache " + self.bvh.name + ": " + str(len(self.frames)) + " frames, " + str(self.size // (1024*1024)) + " MB")
+
+    def capacity(self):
+        """
+        number of frames fitting into memory budget
+        """
+        return (min(self.bvh.frameCount, self.budget // self.framesize) if self.framesize > 0 else self.bvh.frameCount)
+
+    def stop(self):
+        self.stopped = True
+
+    def position(self, frame):
+        """
+        position of frame in bone matrices, None if bone matrices of frame are not calculated (yet)
+        """
+        pos = (frame - self.start) % self.bvh.frameCount
+        return (pos if pos < self.computed else None)
+
+    def calcMatrices(self):
+        """
+        bone matrices of all frames in order of playback, calculated in contiguous chunks
+        (in streaming mode a chunk has the size of the ring buffer, the frames are decoded separately)
+        """
+        bvh = self.bvh
+        count = bvh.frameCount
+        step = bvh.ringsize if bvh.offsets is not None else count
+        while self.computed < self.count and not self.stopped:
+            first = (self.start + self.computed) % count
+            end = min(count, first + step, first + self.count - self.computed)
+            pos = slice(self.computed, self.computed + end - first)
+            (self.globalmats[pos], self.poseverts[pos]) = self.skeleton.poseFrames(bvh.joints, np.arange(end - first), bvh.frameMatrices(first, end))
+            self.computed += end - first
+
+    def calcFrame(self, frame):
+        """
+        skinned positions and normals of all meshes for one frame
+        """
+        pos = self.position(frame)
+        data = []
+        for (mesh, bWeights), (table, index) in zip(self.meshes, self.tables):
+            mats = self.poseverts[pos, index, :3].reshape(-1, 12)
+            coords = np.empty(len(mesh.gl_coord), dtype=np.float32)
+            self.skeleton.skinCoords(mesh, table, mats, coords)
+            normals = mesh.vertexNormals(np.reshape(coords, (-1, 3)), mesh.normweighting).ravel()
+            data.append((coords, normals))
+        return (data)
+
+    def addFrame(self, frame, data):
+        """
+        add a frame, least recently used frames are removed when memory budget is exceeded
+        """
+        with self.lock:
+            while len(self.frames) > 0 and self.size + self.framesize > self.budget:
+                self.frames.popitem(last=False)
+                self.size -= self.framesize
+            if self.size + self.framesize <= self.budget:
+                self.frames[frame] = data
+                self.size += self.framesize
+
+    def bake(self, bckproc, *args):
+        """
+        calculate bone matrices, then frames in order of playback starting with current frame, runs in background
+        stops when the memory budget is used
+        """
+        self.calcMatrices()
+        count = self.bvh.frameCount
+        for i in range(self.count):
+            if self.stopped:
+                break
+            frame = (self.start + i) % count
+            if frame not in self.frames:
+                self.addFrame(frame, self.calcFrame(frame))
+        self.env.logLine(8, str(self))
+
+    def showFrame(self, frame, bones_only=False):
+        """
+        display a cached frame
+
+        :return: False if frame is not in cache
+        """
+        with self.lock:
+            data = self.frames.get(frame)
+            if data is None:
+                return False
+            self.frames.move_to_end(frame)
+
+        pos = self.position(frame)
+        if pos is None:
+            return False
+        self.skeleton.assignPoseMatrices(self.globalmats[pos], self.poseverts[pos])
+        if not bones_only:
+            for (mesh, bWeights), (coords, normals) in zip(self.meshes, data):
+                mesh.gl_coord[:] = coords
+                mesh.gl_norm[:] = normals
+            for asset in self.approximated:
+                asset.obj.approxToBasemesh(asset, self.glob.baseClass.baseMesh)
+        return True
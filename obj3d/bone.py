@@ -50,6 +50,7 @@ class cBone():
             self.weightref = weights
 
         self.matRestGlobal = None       # rest Pose, global position 4x4 Matrix of bone object
+        self.matRestGlobalInv = None    # inverse of rest Pose (None if not invertible)
         self.matRestLocal = None        # rest Pose, relative (local)  position 4x4 Matrix of bone object
 
         self.matPoseGlobal = None                       # global pose matrix
@@ -148,6 +149,10 @@ class cBone():
     def calcRestMatFromSkeleton(self):
         normal = self.getNormal()
         self.matRestGlobal = self.calcLocalRestMat(normal)
+        try:
+            self.matRestGlobalInv = np.linalg.inv(self.matRestGlobal)
+        except np.linalg.LinAlgError:
+            self.matRestGlobalInv = None
         if self.parent:
             self.matRestLocal = np.dot(np.linalg.inv(self.parent.matRestGlobal), self.matRestGlobal)
         else:
@@ -162,7 +167,7 @@ class cBone():
 
         # Calculate rotations
         self.matPoseLocal[:3,:3] = poseMat[:3,:3]
-        invRest = np.linalg.inv(self.matRestGlobal)            # TODO precalculate this one time maybe
+        invRest = self.matRestGlobalInv
         self.matPoseLocal = np.dot(np.dot(invRest, self.matPoseLocal), self.matRestGlobal)
 
         # Add translations from original
@@ -182,12 +187,11 @@ class cBone():
         else:
             self.matPoseGlobal = np.dot(self.matRestLocal, self.matPoseLocal)
 
-        try:
-            self.matPoseVerts = np.dot(self.matPoseGlobal, np.linalg.inv(self.matRestGlobal))
-        except:
+        if self.matRestGlobalInv is None:
             self.glob.env.logLine(1, "Cannot calculate pose verts matrix for bone " + self.name)
             self.glob.env.logLine(1, "Non-singular rest matrix " + str(self.matRestGlobal))
             return False
+        self.matPoseVerts = np.dot(self.matPoseGlobal, self.matRestGlobalInv)
         return True
 
     def poseBone(self):
@@ -201,6 +205,145 @@ class cBone():
         self.posetailPos = vec.transpose()[:3]
 
 
+class skinTable():
+    """
+    bone weights of one mesh as a table instead of a list of vertices per bone
+
+    vertices are sorted by the number of bones influencing them, the table has one column per influence
+    column k is only used for the first layers[k] rows, so no calculation is done for unused entries
+    buffers are allocated once and reused for each frame
+    """
+    def __init__(self, bWeights, numverts):
+        self.numverts = numverts
+        self.bones = list(bWeights)     # bone names, index of table refers to it
+
+        # flat arrays of all entries: vertex, bone index, weight
+        #
+        ev = np.concatenate([np.zeros(0, dtype=np.int64)] + [bWeights[bone][0] for bone in self.bones]).astype(np.int64)
+        eb = np.repeat(np.arange(len(self.bones)), [len(bWeights[bone][0]) for bone in self.bones])
+        ew = np.concatenate([np.zeros(0, dtype=np.float32)] + [bWeights[bone][1] for bone in self.bones]).astype(np.float32)
+
+        # rows sorted by number of influences (descending), entries grouped by row
+        #
+        vcount = np.bincount(ev, minlength=numverts)
+        verts = np.flatnonzero(vcount)
+        self.verts = verts[np.argsort(-vcount[verts], kind='stable')]
+        self.unweighted = np.flatnonzero(vcount == 0)
+
+        row = np.zeros(numverts, dtype=np.int64)
+        row[self.verts] = np.arange(len(self.verts))
+        order = np.argsort(row[ev], kind='stable')
+        (ev, eb, ew) = (row[ev[order]], eb[order], ew[order])
+
+        counts = vcount[self.verts]
+        maxinf = int(counts[0]) if len(counts) > 0 else 0
+        column = np.arange(len(ev)) - np.repeat(np.cumsum(counts) - counts, counts)
+        self.index = np.zeros((len(self.verts), maxinf), dtype=np.int64)
+        self.weights = np.zeros((len(self.verts), maxinf), dtype=np.float32)
+        self.index[ev, column] = eb
+        self.weights[ev, column] = ew
+        self.layers = [int(np.count_nonzero(counts > k)) for k in range(maxinf)]
+
+        # buffers: blended 3x4 matrix per vertex, temporary matrices, coordinates in table order
+        #
+        n = len(self.verts)
+        self.blend = np.empty((n, 12), dtype=np.float32)
+        self.temp = np.empty((n, 12), dtype=np.float32)
+        self.source = np.empty((n, 3), dtype=np.float32)
+        self.result = np.empty((n, 3), dtype=np.float32)
+        self.dqblend = None         # buffers for dual quaternion skinning, created on first use
+
+    def blendMatrices(self, mats):
+        """
+        weighted sum of the bone matrices per vertex
+
+        :param mats: array (bones, 12) with the first 3 rows of the 4x4 matrices in order of self.bones
+        :return: array (vertices, 3, 4) in table order
+        """
+        # numpy: for bone in bones: vec = mat[bone] * weight, summed per vertex
+        #
+        if len(self.layers) > 0:
+            np.take(mats, self.index[:,0], axis=0, out=self.blend)
+            self.blend *= self.weights[:,0,None]
+        for k in range(1, len(self.layers)):
+            n = self.layers[k]
+            temp = self.temp[:n]
+            np.take(mats, self.index[:n,k], axis=0, out=temp)
+            temp *= self.weights[:n,k,None]
+            self.blend[:n] += temp
+        return (self.blend.reshape(-1, 3, 4))
+
+    def transform(self, mats, coords):
+        """
+        linear blend skinning
+
+        :param mats: array (bones, 12), see blendMatrices
+        :param coords: unposed coordinates (at least numverts, 3)
+        :return: posed coordinates of weighted vertices in table order (see self.verts)
+        """
+        blend = self.blendMatrices(mats)
+        np.take(coords, self.verts, axis=0, out=self.source)
+        np.einsum('nij,nj->ni', blend[:,:,:3], self.source, out=self.result)
+        self.result += blend[:,:,3]
+        return (self.result)
+
+    def blendDualQuaternions(self, dquats):
+        """
+        weighted sum of the dual quaternions of the bones per vertex
+
+        quaternions q and -q describe the same rotation, so each one is flipped to the hemisphere
+        of the quaternion of the first bone influencing the vertex before adding it
+
+        :param dquats: array (bones, 8), see core.math.dualQuaternionsFromMatrices
+        :return: array (vertices, 8) in table order, not normalized
+        """
+        n = len(self.verts)
+        if self.dqblend is None:
+            self.dqblend = np.empty((n, 8), dtype=np.float32)
+            self.dqtemp = np.empty((n, 8), dtype=np.float32)
+            self.dqsign = np.empty(n, dtype=np.float32)
+
+        if len(self.layers) > 0:
+            np.take(dquats, self.index[:,0], axis=0, out=self.dqblend)
+            reference = self.dqblend[:,:4].copy()
+            self.dqblend *= self.weights[:,0,None]
+
+        for k in range(1, len(self.layers)):
+            n = self.layers[k]
+            temp = self.dqtemp[:n]
+            sign = self.dqsign[:n]
+            np.take(dquats, self.index[:n,k], axis=0, out=temp)
+            np.einsum('ij,ij->i', temp[:,:4], reference[:n], out=sign)
+            np.copysign(self.weights[:n,k], sign, out=sign)
+            temp *= sign[:,None]
+            self.dqblend[:n] += temp
+        return (self.dqblend)
+
+    def transformDualQuat(self, dquats, coords):
+        """
+        dual quaternion skinning, avoids the loss of volume of linear blend skinning on twisted joints
+
+        :param dquats: array (bones, 8), see blendDualQuaternions
+        :param coords: unposed coordinates (at least numverts, 3)
+        :return: posed coordinates of weighted vertices in table order (see self.verts)
+        """
+        blend = self.blendDualQuaternions(dquats)
+        np.take(coords, self.verts, axis=0, out=self.source)
+
+        # normalize by length of real part
+        #
+        length = np.sqrt(np.einsum('ij,ij->i', blend[:,:4], blend[:,:4]))
+        length[length < 1e-8] = 1.0
+        blend /= length[:,None]
+        (w, v, dw, dv) = (blend[:,0,None], blend[:,1:4], blend[:,4,None], blend[:,5:8])
+
+        # rotation: p + 2 * v x (v x p + w * p), translation: 2 * (w * dv - dw * v + v x dv)
+        #
+        p = self.source
+        np.add(p, 2.0 * np.cross(v, np.cross(v, p) + w * p), out=self.result)
+        self.result += 2.0 * (w * dv - dw * v + np.cross(v, dv))
+        return (self.result)
+
 
 class boneWeights():
     def __init__(self, glob, default_skeleton, mesh):
@@ -210,6 +353,15 @@ class boneWeights():
         self.root = default_skeleton.root
         self.bWeights = {}
         self.mesh = mesh
+        self.skintable = None       # table for skinning, created on first use
+
+    def getSkinTable(self):
+        """
+        bone weights converted to a table used for skinning, recreated when number of vertices changed
+        """
+        if self.skintable is None or self.skintable.numverts != self.mesh.n_origverts:
+            self.skintable = skinTable(self.bWeights, self.mesh.n_origverts)
+        return (self.skintable)
 
     def createWeightsPerBone(self, wdict):
         cnt = self.mesh.n_origverts
@@ -270,6 +422,7 @@ class boneWeights():
 
         if len(vs) > 0:
             self.bWeights[self.root] = (np.asarray(vs, dtype=np.uint32), np.asarray(ws, dtype=np.float32))
+        self.skintable = None
 
     def sortWeights(self, weights):
         """
@@ -319,18 +472,11 @@ class boneWeights():
 
         print ("Calculate bone weights " + asset.name)
 
-        # recalculate the input in case of mesh loaded in binary form for easier calculation (tested)
+        # inverse map of the asset (created on first use, also when mesh is loaded in binary form)
         # form is:
         # vertex_num: baseskeleton: [(vertexnum_asset, weight), (...) ]
 
-        self.vertWeights = {}
-        for idx in range(asset.ref_vIdxs.shape[0]):
-            for l in range(0,3):
-                base_vert, w = asset.ref_vIdxs[idx, l], asset.weights[idx, l]
-                if base_vert in self.vertWeights:
-                    self.vertWeights[base_vert].append((idx, w))
-                else:
-                    self.vertWeights[base_vert] = [(idx, w)]
+        self.vertWeights = asset.getVertWeights()
 
         # now generate the weights to be calculated by createWeightsPerBone
         #
@@ -352,6 +498,7 @@ class boneWeights():
         # since the algorithm above also creates multiple values for one index it must be changed to unique
         #
         self.bWeights = self.deDuplicateWeights(self.bWeights)
+        self.skintable = None
 
     def transferWeights(self, customskeleton):
 
@@ -4,8 +4,73 @@ binary file operations on object3d
 
 import numpy as np
 import os
+import struct
+import zipfile
+from io import BytesIO
 from obj3d.fops_wavefront import importWaveFront
 
+def saveUncompressed(filename, content):
+    """
+    save arrays as npz-file without compression (version 2), each array starts at a 64 byte boundary,
+    so it can be memory mapped. It is written to a temporary file first, because
+    the old file might be mapped by a loaded object
+    """
+    tmpname = filename + ".tmp"
+    with zipfile.ZipFile(tmpname, "w", compression=zipfile.ZIP_STORED) as zf:
+        for name, arr in content.items():
+            buf = BytesIO()
+            np.lib.format.write_array(buf, np.asanyarray(arr), allow_pickle=False)
+
+            # padding is done with an extra field in the local header (30 bytes + name + extra)
+            #
+            zinfo = zipfile.ZipInfo(name + ".npy", date_time=(1980, 1, 1, 0, 0, 0))
+            zinfo.compress_type = zipfile.ZIP_STORED
+            pad = -(zf.fp.tell() + 30 + len(zinfo.filename) + 4) % 64
+            zinfo.extra = struct.pack("<HH", 0xD935, pad) + bytes(pad)
+            zf.writestr(zinfo, buf.getvalue())
+    try:
+        os.replace(tmpname, filename)
+    except OSError:
+        # on Windows a file memory mapped by a loaded object cannot be replaced, the old file is kept
+        os.remove(tmpname)
+        raise
+
+def loadBinary(path):
+    """
+    load a binary file, uncompressed files (version 2) are memory mapped (copy on write),
+    compressed files (version 1) are loaded via numpy
+
+    :return: dictionary name -> array or NpzFile
+    """
+    with zipfile.ZipFile(path) as zf:
+        infos = zf.infolist()
+
+    if any(info.compress_type != zipfile.ZIP_STORED for info in infos):
+        return (np.load(path))
+
+    mm = np.memmap(path, dtype=np.uint8, mode='c')
+    content = {}
+    with open(path, "rb") as f:
+        for info in infos:
+            # the npy data starts behind the local header, sizes of name and extra field are read from there
+            #
+            (lname, lextra) = struct.unpack("<HH", mm[info.header_offset+26:info.header_offset+30].tobytes())
+            f.seek(info.header_offset + 30 + lname + lextra)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                (shape, fortran, dtype) = np.lib.format.read_array_header_1_0(f)
+            elif version == (2, 0):
+                (shape, fortran, dtype) = np.lib.format.read_array_header_2_0(f)
+            else:
+                return (np.load(path))
+            if dtype.hasobject:
+                return (np.load(path))
+
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            content[name] = np.ndarray(shape, dtype=dtype, buffer=mm, offset=f.tell(), order='F' if fortran else 'C')
+
+    return (content)
+
 def exportObj3dBinary(filename, obj, content = {}):
 
     #content = {}
@@ -30,55 +95,24 @@ def exportObj3dBinary(filename, obj, content = {}):
     # now the overflowbuffer to help OpenGL
     #
     content["overflow"] = obj.overflow 
-    ngroups = len(obj.npGrpNames)
 
-    # now the more complex calculation of the faces as
-    # index-buffer groups (i4) Element-Start, (i4) NumFaces, and a bool)
-    #
-    groupinfo = np.zeros(ngroups, dtype=np.dtype('i4,i4,?'))
-    allvertnums = 0
-    allfaces = 0
-    for num, npelem in enumerate (obj.npGrpNames):
-        cnt = 0
-        elem = npelem.decode("utf-8")
-        group = obj.loadedgroups[elem]
-        faces = group["v"]
-        lfaces = len(faces)
-        for face in faces:
-            cnt += len(face)
-        groupinfo[num] = tuple([allvertnums, lfaces, group["uv"]])
-        allvertnums += cnt
-        allfaces += lfaces
-    
-    # two flat arrays for number of verts and position
+    # faces as index-buffer groups (i4) Element-Start, (i4) NumFaces, and a bool)
+    # and two flat arrays for number of verts and position
     #
-    vertsperface = np.zeros(allfaces, dtype=np.dtype('i4'))
-    faceverts = np.zeros(allvertnums, dtype=np.dtype('i4'))
-    finfocnt = 0
-    fvertcnt = 0
-    for npelem in obj.npGrpNames:
-        elem = npelem.decode("utf-8")
-        group = obj.loadedgroups[elem]
-        faces = group["v"]
-        for face in faces:
-            for vert in face:
-                faceverts[fvertcnt] = vert
-                fvertcnt += 1
-            vertsperface[finfocnt] = len(face)
-            finfocnt += 1
-
+    (groupinfo, vertsperface, faceverts) = obj.getFlatFaces()
     content["groupinfo"] = groupinfo
     content["vertsperface"] = vertsperface
     content["faceverts"] = faceverts
 
-    obj.env.logLine(8, "Save compressed: " + filename)
+    # version 2: triangles of all groups, can be used directly by OpenGL (gl_icoord is the flattened array)
+    #
+    content["fverts"] = obj.fverts if obj.visible is None else obj.triangulateFaces(vertsperface, faceverts)[0]
+
+    obj.env.logLine(8, "Save binary: " + filename)
     try:
-        f = open(filename, "wb")
-        np.savez_compressed(f, **content)
+        saveUncompressed(filename, content)
     except OSError as error:
-        return (False, str(error))
-    finally:
-        f.close()
+        return (False, "Cannot save binary (file might be in use): " + str(error))
 
     return(True, None)
 
@@ -108,36 +142,17 @@ def importObjValues(npzfile, obj):
     obj.n_uvs   = len(obj.uvs)
     obj.overflow = npzfile["overflow"]
 
-    # regenerate groups from groupinfo, vertsperface, faceverts
-    # index-buffer groups (Start, NumFaces, bool)
+    # faces stay in flat arrays, index-buffer groups (Start, NumFaces, bool)
+    # version 1 files have no triangles, so they are calculated
     #
-    verts = npzfile["faceverts"]
-    fsize = npzfile["vertsperface"]
-    groups = {}
-    j = 0
-    for num, elem in enumerate(npzfile["groupinfo"]):
-        start = elem[0]
-        faces = elem[1]
-        f = []
-        fs = start
-        for i in range(faces):
-            v = []
-            for k in range(0, fsize[j]):
-                v.append(verts[fs+k])
-            f.append(v)
-            fs += fsize[j]
-            j += 1
-
-        group =  obj.npGrpNames[num].decode("utf-8")
-        groups[group] = { "v": f, "uv": elem[2] }
-
-    obj.createGLFaces(fcnt, ucnt, prim, groups)
+    fverts = npzfile["fverts"] if "fverts" in npzfile else None
+    obj.createGLFaces(fcnt, ucnt, prim, npzfile["groupinfo"], npzfile["vertsperface"], npzfile["faceverts"], fverts)
 
     return (True, None)
 
 def importObj3dBinary(path, obj):
     obj.env.logLine(8, "Read binary: " + path)
-    npzfile = np.load(path)
+    npzfile = loadBinary(path)
     return(importObjValues(npzfile, obj))
 
 def importObjFromFile(path, obj, use_obj=False):
@@ -4,6 +4,47 @@ file operations, wavefront OBJ
 
 import numpy as np
 
+def parseFloats(lines, columns):
+    """
+    parse the numbers of all lines in one step, lines with more columns are parsed line by line
+    """
+    values = np.fromstring(" ".join(lines), dtype=np.float64, sep=" ")
+    if values.size == len(lines) * columns:
+        return (values.reshape(-1, columns))
+
+    values = np.zeros((len(lines), columns), dtype=np.float64)
+    for i, line in enumerate(lines):
+        words = line.split()
+        values[i, :len(words[:columns])] = [float(x) for x in words[:columns]]
+    return (values)
+
+def parseFaceIndices(tokens):
+    """
+    parse all face tokens (a, a/b, a/b/c or a//c), index counts from 1
+    returns vertex index and UV index (-1 if not available) per token
+    """
+    # each token is followed by -1 as a separator, so the number of parts can be checked
+    #
+    nparts = len(tokens[0].split('/'))
+    text = (" -1 ".join(tokens) + " -1").replace('//', '/0/').replace('/', ' ')
+    values = np.fromstring(text, dtype=np.int64, sep=" ")
+    if values.size == len(tokens) * (nparts + 1) and np.all(values[nparts::nparts+1] == -1):
+        values = values.reshape(-1, nparts + 1)
+        vindex = values[:,0] - 1
+        uvindex = values[:,1] - 1 if nparts > 1 else np.full(len(tokens), -1, dtype=np.int64)
+        return (vindex, uvindex)
+
+    # mixed formats
+    #
+    vindex = np.zeros(len(tokens), dtype=np.int64)
+    uvindex = np.full(len(tokens), -1, dtype=np.int64)
+    for i, elem in enumerate(tokens):
+        columns = elem.split('/')
+        vindex[i] = int(columns[0]) - 1
+        if len(columns) > 1 and columns[1] != '':
+            uvindex[i] = int(columns[1]) - 1
+    return (vindex, uvindex)
+
 def importWaveFront(path, obj):
     """
     f  = face
@@ -12,6 +53,8 @@ def importWaveFront(path, obj):
     v  = positions (3d)
     vt = positions (texture)
     usemtl = material (skipped)
+
+    the lines are only sorted by command, numbers are parsed by numpy in one step
     """
 
     try:
@@ -19,165 +62,144 @@ def importWaveFront(path, obj):
     except IOError:
         return (False, "Cannot open file " + path)
     else:
-
-        verts  = []
-        uvs    = []
-        groups = {}
-        groupnames = [] # to keep the group order
-        objname = None
-        prim = 0        # number of needed triangles
-        ln = 0          # line number
-        fcnt = 0        # face-counter
-        ucnt = 0        # UV-face counter
-
-        groupnames.append("mh_default")
-        g = groups["mh_default"] = {"v": [], "uv": [] }
-
-        for line in f:
-            ln += 1
-            words = line.split()
-
-            lwords = len(words) -1
-            if lwords <= 0:
-                continue
-
-            command = words[0]
-
-            # v and vt simply fill buffers (for UV-Map change coordinates)
+        with f:
+            lines = f.read().splitlines()
+
+    vlines = []
+    vtlines = []
+    flines  = []
+    fgroup  = []    # group number per face
+    groupnames = ["mh_default"]
+    groupnum = {"mh_default": 0}
+    current = 0
+    objname = None
+
+    for line in lines:
+        words = line.split(None, 1)
+        if len(words) < 2:
+            continue
+
+        command = words[0]
+        if command == 'v':
+            vlines.append(words[1])
+
+        elif command == 'vt':
+            vtlines.append(words[1])
+
+        elif command == 'f':
+            flines.append(words[1])
+            fgroup.append(current)
+
+        elif command == 'g':
+            # an existing group name does not change the current group
             #
-            if command == 'v':
-                verts.append((float(words[1]), float(words[2]), float(words[3])))
-
-            elif command == 'vt':
-                uvs.append((float(words[1]), 1 - float(words[2])))
-
-            # f, faces, this data is stored groupwise, index counts from 1
-            # a/b ... first one is vertex-index, second one UV
-            #
-            elif command == 'f':
-                vInd  = []
-                uvInd = []
-
-                prim += (lwords-2)  # count number of primitives
-
-                for elem in words[1:]:
-                    columns = elem.split('/')
-                    vindex = int(columns[0]) - 1
-                    vInd.append(vindex)
+            gname = words[1].split()[0]
+            if gname not in groupnum:
+                current = groupnum[gname] = len(groupnames)
+                groupnames.append(gname)
 
-                    if len(columns) > 1 and columns[1] != '':
-                        uc = int(columns[1])
-                        uvInd.append(uc - 1)
+        elif command == 'o':
+            objname = words[1].split()[0]
 
-                g["v"].append(vInd)
-                fcnt += 1
+    verts = parseFloats(vlines, 3) if len(vlines) > 0 else np.zeros((0, 3), dtype=np.float64)
+    uvs = parseFloats(vtlines, 2) if len(vtlines) > 0 else np.zeros((0, 2), dtype=np.float64)
+    uvs[:,1] = 1 - uvs[:,1]
 
-                if len(uvInd) > 0:
-                    g["uv"].append(uvInd)
-                    ucnt += 1
-
-            elif command == 'g':
-                gname = words[1]
-                if gname not in groups:
-                    g = groups[gname] = {"v": [], "uv": [] }
-                    groupnames.append(gname)
-
-            elif command == 'o':
-                objname = words[1]
+    # faces, a/b ... first one is vertex-index, second one UV
+    #
+    ftokens = [line.split() for line in flines]
+    counts = np.fromiter((len(elem) for elem in ftokens), dtype=np.int64, count=len(ftokens))
+    fstart = np.zeros(len(ftokens) + 1, dtype=np.int64)
+    np.cumsum(counts, out=fstart[1:])
+    fgroup = np.asarray(fgroup, dtype=np.int64)
+    tokens = [tok for elem in ftokens for tok in elem]
+    if len(tokens) > 0:
+        (vindex, uvindex) = parseFaceIndices(tokens)
+    else:
+        vindex = uvindex = np.zeros(0, dtype=np.int64)
 
-            else:
-                # print ("Ignore: " + line)
-                pass
-        f.close()
+    fcnt = len(ftokens)     # face-counter
+    prim = int(np.sum(counts - 2)) if fcnt > 0 else 0   # number of needed triangles
 
-    # delete empty groups
-    # must be done in two steps not to destroy iteration, first step can delete empty uvs
+    # faces with UV, groups with at least one face, groups with UV
     #
-    delete = []
-    for g in groups:
-        if len(groups[g]["v"]) == 0:
-            delete.append(g)
-            groupnames.remove(g)
-        if len(groups[g]["uv"]) == 0:
-            del groups[g]["uv"]
-
-    for d in delete:
-        del groups[d]
+    face_uv = np.zeros(fcnt, dtype=bool)
+    if fcnt > 0:
+        face_uv = np.maximum.reduceat(uvindex, fstart[:-1]) >= 0
+    ucnt = int(np.count_nonzero(face_uv))  # UV-face counter
+    group_used = np.bincount(fgroup, minlength=len(groupnames)) > 0
+    group_uv = np.bincount(fgroup, weights=face_uv, minlength=len(groupnames)) > 0
 
     # let the UV coordinates use the same index as the faces, because
     # glDrawElements means one index for UV-Buffer, Normals and coordinates
-    # 
+    #
     # classically there are more UVS because of seams, so we need to duplicated coordinates
-    # we use a -1 filled vertex_uv-Buffer to be filled with correct indices
+    # the first UV used by a vertex (in order of groups and faces) keeps the vertex, other UVs get new vertices
+    # at the end, key for the combination is vert << 32 | uv
     #
     # they should be in overflow-buffer
     # after that we got new uvs, a few more coordinates, and partly a changed index
     # the information about UV is changed to pure bool indicating the availability
-    # 
-    overflowbuf = {}
-
-    n_origverts = n_verts = len(verts) # number of vertices, start with the number we have, will increased in case we need new ones
-    n_uvs = len(uvs)
-    vertex_uv = np.full(n_verts, -1, dtype=np.uint32)
-
-    uvsize = n_verts*3      # try to find a buffer sufficient for the uv-values
-    max_uv = n_uvs * 3 
-    if max_uv > uvsize:
-        uvsize = max_uv
-
-    uv_values = np.zeros (shape=(uvsize, 2), dtype=np.float32)  # should be sufficient for the longest possible buffer
-
-    for g in groups:
-        if "uv" in groups[g] and len(groups[g]["uv"]) > 0:
-            gi = groups[g]["v"]
-            guv = groups[g]["uv"]
-
-            for num, face in enumerate(gi):
-                uvface = guv[num]
-                for inum, vert in enumerate(face):
-                    uvert = uvface[inum]
-
-                    # if vertex_uv[vert] still is unused, set it to the value which is added, no changed
-                    #
-                    if vertex_uv[vert] == 0xffffffff:
-                        vertex_uv[vert] = uvert
-                        uv_values[vert] = uvs[uvert]
-
-                    # in case it is used but different, check if we have the combination already in overflow-buffer
-                    #
-                    elif vertex_uv[vert] != uvert:
-
-                        name = str(vert) + "_" + str(uvert)     # mathematically old makehuman uses sth like vert << 32 | uvert, would also work here
-
-                        if name in overflowbuf:
-                            # print (name + " allready in overflowbuf")
-                            gi[num][inum] = overflowbuf[name]   # we can use it from buffer
-                        else:
-                            # print ("new one needed:" + name)
-                            overflowbuf[name] = n_verts         # we creat a new entry
-                            verts.append(verts[vert])           # append identical coords to the end
-                            uv_values[n_verts] = uvs[uvert]     # place uv-values there
-                            gi[num][inum] = n_verts             # change the index to new appended element
-                            n_verts += 1                        # and increment number of elements
-
-            groups[g]["uv"] = True      # the information is now replaced by the bool we need
-        else:
-            groups[g]["uv"] = False
-
-    overflowtable = np.empty((len(overflowbuf), 2), dtype=np.uint32)
-
-    i = 0
-    for key, value in overflowbuf.items():
-        (a,b) = key.split("_")
-        overflowtable[i] = (a, value)
-        i+=1
-    overflowtable.view('uint32,uint32').sort(order=['f0'], axis=0) # sort by first column in place
+    #
+    n_origverts = len(verts)
+    uv_values = np.zeros((n_origverts, 2), dtype=np.float32)
+    overflowtable = np.zeros((0, 2), dtype=np.uint32)
 
-    # print (overflowtable)
+    # corners of faces with UV in groups with UV, in processing order (groupwise)
+    #
+    forder = np.argsort(fgroup, kind='stable')
+    forder = forder[face_uv[forder] & group_uv[fgroup[forder]]]
+    fcount = counts[forder]
+    corners = np.repeat(fstart[forder] - (np.cumsum(fcount) - fcount), fcount) + np.arange(int(np.sum(fcount)))
+
+    if len(corners) > 0:
+        cv = vindex[corners]
+        cu = uvindex[corners]
+
+        # numpy: first UV per vertex
+        #
+        (uverts, first) = np.unique(cv, return_index=True)
+        vertex_uv = np.full(n_origverts, -1, dtype=np.int64)
+        vertex_uv[uverts] = cu[first]
+        uv_values[uverts] = uvs[cu[first]]
+
+        # different UV: new vertices numbered in order of appearance
+        #
+        over = np.flatnonzero(cu != vertex_uv[cv])
+        keys = (cv[over].astype(np.uint64) << np.uint64(32)) | cu[over].astype(np.uint64)
+        (ukeys, kfirst, kinv) = np.unique(keys, return_index=True, return_inverse=True)
+        rank = np.empty(len(ukeys), dtype=np.int64)
+        rank[np.argsort(kfirst)] = np.arange(len(ukeys))
+
+        source = np.empty(len(ukeys), dtype=np.int64)
+        source[rank] = (ukeys >> np.uint64(32)).astype(np.int64)
+        newuv = np.empty(len(ukeys), dtype=np.int64)
+        newuv[rank] = (ukeys & np.uint64(0xffffffff)).astype(np.int64)
+
+        vindex[corners[over]] = n_origverts + rank[kinv]
+        verts = np.concatenate((verts, verts[source]))
+        uv_values = np.concatenate((uv_values, uvs[newuv].astype(np.float32)))
+
+        # sort by first column, then second one
+        #
+        dest = np.arange(n_origverts, n_origverts + len(ukeys))
+        order = np.lexsort((dest, source))
+        overflowtable = np.column_stack((source[order], dest[order])).astype(np.uint32)
+
+    # flat face description, faces are stored groupwise, empty groups are deleted
+    #
+    forder = np.argsort(fgroup, kind='stable')
+    vertsperface = counts[forder].astype(np.int32)
+    corners = np.repeat(fstart[forder] - (np.cumsum(vertsperface) - vertsperface), vertsperface) + np.arange(int(np.sum(vertsperface)))
+    faceverts = vindex[corners].astype(np.int32)
 
-    uv_values.resize((n_verts, 2), refcheck=False)          # shorten buffer back to what we really needed.
+    lfaces = np.bincount(fgroup, minlength=len(groupnames))[group_used]
+    groupinfo = np.zeros(len(lfaces), dtype=np.dtype('i4,i4,?'))
+    groupinfo['f0'] = np.concatenate(([0], np.cumsum(vertsperface)))[np.cumsum(lfaces) - lfaces]
+    groupinfo['f1'] = lfaces
+    groupinfo['f2'] = group_uv[group_used]
 
-    del vertex_uv                                           # the helper is no longer necessary
+    groupnames = [gname for num, gname in enumerate(groupnames) if group_used[num]]
 
     # sanity test for finding vertices costs too much time
     #
@@ -186,7 +208,7 @@ def importWaveFront(path, obj):
     obj.setName(objname)
     obj.setGroupNames(groupnames)
     obj.createGLVertPos(verts, uv_values, overflowtable, n_origverts)          # TODO consider to recombine createGLVertPos and createGLFaces
-    obj.createGLFaces(fcnt, ucnt, prim, groups)
+    obj.createGLFaces(fcnt, ucnt, prim, groupinfo, vertsperface, faceverts)
 
     del verts
     del uvs
@@ -26,8 +26,12 @@ class object3d:
         self.uvs   = []     # will contain coordinates for uvs
         self.fuvs  = None   # will contain UV buffer or will stay none (TODO: is that needed?)
         self.fverts  = []   # will contain vertices per face, [verts, 3] array of uint32 for openGL > 2
+        self.trifaces = []  # will contain the number of the original face per triangle (exports, picking)
         self.n_fverts = 0    # number of vertices for open gl
-        self.loadedgroups = None # will contain the group after loading from file (also for hidden geometry)
+        self.loadedgroups = None # will contain the group after loading from file (also for hidden geometry), created on demand from flat arrays
+        self.groupinfo = None    # flat face description: per group start in faceverts, number of faces, uv
+        self.vertsperface = None # flat face description: number of vertices per face
+        self.faceverts = None    # flat face description: vertex numbers of all faces (groupwise)
         self.group = []     # will contain pointer to group per face
 
         self.overflow = None # will contain a table for double used vertices [source, dest]
@@ -41,6 +45,8 @@ class object3d:
 
         self.gl_uvcoord = []  # will contain flattened gluv-Buffer
         self.gl_norm  = []    # will contain flattended normal buffer
+        self.gi_norm  = []    # will contain normal per vertex, array (n_verts, 3)
+        self.normweighting = "area"     # weighting used by calcNormals, kept for updateNormals
         self.n_glnorm  = 0    # number of normals for open gl
 
         self.gl_icoord = []     # openGL-Drawarray Index
@@ -134,6 +140,18 @@ class object3d:
         self.npGrpNames = np.array(names, dtype='|S'+str(nlen))
         self.n_groups = len(names)
 
+    def markUnchanged(self, unchanged=True):
+        """
+        mesh was not changed, so the next upload to OpenGL can be skipped
+        a change is kept until it is uploaded, even when the mesh is marked as unchanged later
+        """
+        if self.openGL is not None:
+            glbuffers = self.openGL.glbuffers
+            if unchanged:
+                glbuffers.unchanged = True
+            else:
+                glbuffers.changed = True
+
     def getOpenGLIndex(self):
         #print (self.filename +  " deleted verts" if self.gl_hicoord is not None else self.filename + " normal")
         return (self.gl_hicoord if self.gl_hicoord is not None else self.gl_icoord)
@@ -165,77 +183,155 @@ class object3d:
         dst = np.repeat(self.overflow[:,1], 3)*3 + index
         arr[dst]   = arr[src]
 
-    def calcNormals(self):
+    def calcFaceNormals(self, coord, weighting="area", fverts=None):
         """
-        calculates face-normals and then vertex normals
-        """
-        self.gi_norm = np.zeros((self.n_verts, 3), dtype=np.float32)
-
-        # set the face normals for each vertex to zero, set the counter to zero
-        #
-        fa_norm = np.zeros((self.n_verts, 3), dtype=np.float32)
-        fa_cnt  = np.zeros(self.n_verts, dtype=np.uint32)
+        calculates face-normals, returns an array with one weighted normal per corner (faces, 3, 3)
 
-        lfv = len(self.fverts)
-        fnorm = np.zeros((lfv,3), dtype=np.float32)
+        :param coord: positions, array (n_verts, 3)
+        :param weighting: "area" the length of the normal is the double area of the triangle,
+                          "angle" unit normals multiplied by the angle of the triangle at the corner
+        :param fverts: triangles to use, default is self.fverts
+        """
+        if fverts is None:
+            fverts = self.fverts
 
-        # numpy: create index to iterate and 3 vectors and put result to fnorm
-        # for elem in self.fverts:
-        #    v = self.coord[elem]
+        # numpy: create 3 vectors and put result to fnorm
+        # for elem in fverts:
+        #    v = coord[elem]
         #    norm = np.cross(v[0] - v[1], v[1] - v[2])
         #
-        ix = np.s_[:lfv]
-        fvert = self.coord[self.fverts[ix]]
+        fvert = coord[fverts]
         v1 = fvert[:,0,:]
         v2 = fvert[:,1,:]
         v3 = fvert[:,2,:]
         va = v1 - v2
         vb = v2 - v3
-        fnorm[ix] = np.cross(va, vb)
+        fnorm = np.cross(va, vb)
+
+        if weighting != "angle":
+            return (np.repeat(fnorm[:, np.newaxis, :], 3, axis=1))
+
+        # angle at each corner between the two edges, unit normal multiplied by angle
+        #
+        e1 = np.stack((v2 - v1, v3 - v2, v1 - v3), axis=1)
+        e2 = np.stack((v3 - v1, v1 - v2, v2 - v3), axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cosa = np.einsum('ijk,ijk->ij', e1, e2) / (np.linalg.norm(e1, axis=2) * np.linalg.norm(e2, axis=2))
+            angle = np.arccos(np.clip(np.nan_to_num(cosa, nan=1.0), -1.0, 1.0))
+            unit = fnorm / np.linalg.norm(fnorm, axis=1)[:, np.newaxis]
+        unit = np.nan_to_num(unit, nan=0.0)
+        return (unit[:, np.newaxis, :] * angle[:, :, np.newaxis])
+
+    def vertexNormals(self, coord, weighting="area"):
+        """
+        vertex normals for positions without changing the mesh
 
-        # calculate face normal and summarize them with other (for each 3 verts per triangle)
-        for ix, elem in enumerate(self.fverts):
-            fa_norm[elem[0]] += fnorm[ix]
-            fa_norm[elem[1]] += fnorm[ix]
-            fa_norm[elem[2]] += fnorm[ix]
-            fa_cnt[elem[0]] += 1
-            fa_cnt[elem[1]] += 1
-            fa_cnt[elem[2]] += 1
+        :param coord: positions, array (n_verts, 3)
+        :param weighting: "area" or "angle", see calcFaceNormals
+        :return: normals, array (n_verts, 3)
+        """
+        cnorm = self.calcFaceNormals(coord, weighting).reshape(-1, 3)
+
+        # summarize face normals for each vertex, numpy: bincount with vertex index per component
+        # for ix, elem in enumerate(self.fverts):
+        #    fa_norm[elem[0]] += fnorm[ix] ...
+        #
+        index = self.fverts.ravel()
+        fa_norm = np.zeros((self.n_verts, 3), dtype=np.float64)
+        for i in range(0, 3):
+            fa_norm[:,i] = np.bincount(index, weights=cnorm[:,i], minlength=self.n_verts)[:self.n_verts]
 
         # because part of the faces belong to the overflow buffer add them as well
         #
         #for (source, dest) in self.overflow:
         #    fa_norm[source] += fa_norm[dest]
-        #    fa_cnt[source]  += fa_cnt[dest]
 
         src = self.overflow[:,0]
         dst = self.overflow[:,1]
+        np.add.at(fa_norm, src, fa_norm[dst])
 
-        fa_cnt[src] += fa_cnt[dst]
-        fa_norm[src] += fa_norm[dst]
+        normals = self.normalizeNormals(fa_norm)
 
-        # now divide by the number of edges and normalize length with np.linalg.norm
-        # ignore zero weights ( fa_norm = fa_norm / fa_cnt), set these to 1.0
+        # simply copy for the doubles in the end using overflow
         #
-        with np.errstate(divide='ignore', invalid='ignore'):
-            divisor = np.divide(fa_norm, np.expand_dims(fa_cnt, axis=1))
-        divisor = np.nan_to_num(divisor, nan=1.0)
+        # for (source, dest) in self.overflow:
+        #    normals[dest] = normals[source]
 
-        # calculate norm
+        normals[dst] = normals[src]
+        return (normals)
+
+    def calcNormals(self, coord=None, weighting="area"):
+        """
+        calculates face-normals and then vertex normals
+
+        :param coord: positions, array (n_verts, 3), default is self.coord
+        :param weighting: "area" or "angle", see calcFaceNormals
+        """
+        if coord is None:
+            coord = self.coord
+        self.normweighting = weighting
+        self.gi_norm = self.vertexNormals(coord, weighting)
+
+        # flatten vector, an existing buffer is overwritten (it is used as memory for OpenGL)
         #
-        ix = np.s_[:]
-        self.gi_norm[ix] = divisor / np.linalg.norm(divisor)
+        if isinstance(self.gl_norm, np.ndarray) and len(self.gl_norm) == self.n_verts * 3:
+            self.gl_norm[:] = self.gi_norm.ravel()
+        else:
+            self.gl_norm = self.gi_norm.flatten()
 
-        # simply copy for the doubles in the end using overflow
+    def normalizeNormals(self, fa_norm):
+        """
+        normalize length of each vertex normal, unused vertices (length 0) are set to 1.0 before
+        """
+        length = np.linalg.norm(fa_norm, axis=1)
+        fa_norm[length == 0.0] = 1.0
+        length[length == 0.0] = np.sqrt(3.0)
+        return ((fa_norm / length[:, np.newaxis]).astype(np.float32))
+
+    def updateNormals(self, verts=None):
+        """
+        recalculate normals from the current positions (gl_coord), the weighting of the last calcNormals is used
+
+        :param verts: vertices which were moved, only these and their one-ring get new normals.
+                      None recalculates all normals
+        """
+        coord = np.reshape(self.gl_coord, (-1, 3))
+        if verts is None or len(self.gi_norm) != self.n_verts:
+            self.calcNormals(coord, self.normweighting)
+            return
+
+        src = self.overflow[:,0]
+        dst = self.overflow[:,1]
+
+        # overflow vertices are moved with their source
         #
-        # for (source, dest) in self.overflow:
-        #    self.gi_norm[dest] =  self.gi_norm[source]
+        moved = np.zeros(self.n_verts, dtype=bool)
+        moved[verts] = True
+        moved[dst] |= moved[src]
 
+        # all faces with a moved vertex change, so their vertices (one-ring) get new normals
+        # the sums of these are calculated from all faces they belong to
+        #
+        faces = moved[self.fverts].any(axis=1)
+        affected = np.zeros(self.n_verts, dtype=bool)
+        affected[self.fverts[faces]] = True
+        affected[src] |= affected[dst]
+        affected[dst] |= affected[src]
+        fverts = self.fverts[affected[self.fverts].any(axis=1)]
+
+        cnorm = self.calcFaceNormals(coord, self.normweighting, fverts).reshape(-1, 3)
+        index = fverts.ravel()
+        fa_norm = np.zeros((self.n_verts, 3), dtype=np.float64)
+        for i in range(0, 3):
+            fa_norm[:,i] = np.bincount(index, weights=cnorm[:,i], minlength=self.n_verts)[:self.n_verts]
+        np.add.at(fa_norm, src, fa_norm[dst])
+
+        ix = np.flatnonzero(affected)
+        self.gi_norm[ix] = self.normalizeNormals(fa_norm[ix])
         self.gi_norm[dst] = self.gi_norm[src]
 
-        # flatten vector
-        #
-        self.gl_norm = self.gi_norm.flatten()
+        norm = np.reshape(self.gl_norm, (-1, 3))
+        norm[ix] = self.gi_norm[ix]
 
     def calcFaceBufSize(self, mask, overrideignore=False):
         """
@@ -250,7 +346,7 @@ class object3d:
             elem = npelem.decode("utf-8")
             if self.visible is not None and elem not in self.visible and not overrideignore:
                 continue
-            faces = self.loadedgroups[elem]["v"]
+            faces = self.getGroups()[elem]["v"]
             if mask is None:
                 # simple case, just count indices and faces
                 #
@@ -287,7 +383,7 @@ class object3d:
             elem = npelem.decode("utf-8")
             if self.visible is not None and elem not in self.visible and not overrideignore:
                 continue
-            group = self.loadedgroups[elem]
+            group = self.getGroups()[elem]
             faces = group["v"]
             if mask is None:
                 for face in faces:
@@ -319,28 +415,59 @@ class object3d:
         return (highest + 1)
 
     def unUsedVerts(self, faceind):
-        indlen = len(faceind)
         usedmax = len(self.gl_uvcoord) // 2
         ba = np.full((usedmax), 0)
-        for cnt in range(0, indlen):
-            ba[faceind[cnt]] = 1
+        ba[faceind] = 1
         return (ba)
 
     def shortenOverflow(self, mapping):
-        arr = []
+        """
+        overflow with new numbers, entries where source or dest is not used are removed
+        """
         if len(self.overflow) > 0:
-            for i, (s,d) in enumerate(self.overflow):
-                source = mapping[s]
-                dest = mapping[d]
-                if source != -1 and dest != -1:
-                    arr.append([source, dest])
-            return (np.array(arr, dtype=np.uint32))
+            m = mapping[self.overflow]
+            return (m[np.all(m != -1, axis=1)].astype(np.uint32))
         else:
             return None
 
-    def getVisGeometry(self, displayhidden, helper=False):
+    def compactVerts(self, mask):
         """
-        return flattened vectors with coordinates, norms, uvcoords, vertex-per-face, faces and overflow
+        vectorized compaction of coordinates, normals and uvs, only used vertices (mask = 1) are kept
+        returns mapping (old -> new number, -1 for removed vertices) and the flattened arrays
+        """
+        # numpy: the used vertices sorted ascending are the new order
+        # for cnt in range(0, usedmax):
+        #    d = mapping[cnt]
+        #    if d != -1:
+        #        coord[d*3:d*3+3] = self.gl_coord[cnt*3:cnt*3+3]   (same for uvs and normals)
+        #
+        mapping, newcoord = self.createMapping(mask)
+        used = np.flatnonzero(mapping != -1)
+        coord = np.reshape(self.gl_coord, (-1, 3))[used].ravel()
+        norm = np.reshape(self.gl_norm, (-1, 3))[used].ravel()
+        uvcoord = np.reshape(self.gl_uvcoord, (-1, 2))[used].ravel()
+        return mapping, coord, norm, uvcoord
+
+    def compactWeights(self, mapping, bweights):
+        """
+        vertex numbers of weights index array are replaced by new numbers,
+        the needed weights will be copied
+        """
+        if bweights is None:
+            return None
+
+        nweights = {}
+        for elem in bweights:
+            (ind, w) = bweights[elem]
+            d = mapping[ind]
+            used = d != -1
+            if np.any(used):
+                nweights[elem] = (d[used].astype(np.uint32), np.asarray(w)[used].astype(np.float32))
+        return (nweights)
+
+    def getVisGeometry(self, displayhidden, helper=False, bweights=None):
+        """
+        return flattened vectors with coordinates, norms, uvcoords, vertex-per-face, faces, overflow and weights
         values are deduplicated, used for exports
         """
         mask = self.hiddenMask() if displayhidden is False else None
@@ -357,38 +484,16 @@ class object3d:
         mx = self.fillFaceBuffers(vertsperface, faceverts, mask, helper)
         if mask is not None:
             mask = self.unUsedVerts(faceverts)
-            usedmax = len(mask)
-            mapping, newcoord = self.createMapping(mask)
-            coord = np.zeros(newcoord*3,  dtype=np.float32)
-            norm = np.zeros(newcoord*3,  dtype=np.float32)
-            gl_uvcoord = np.zeros(newcoord*2,  dtype=np.float32)
-            for cnt in range(0, usedmax):
-                d = mapping[cnt]
-                if d != -1:
-                    s2 = cnt * 2
-                    s3 = cnt * 3
-                    d2 = d * 2
-                    d3 = d * 3
-
-                    coord[d3] = self.gl_coord[s3]
-                    coord[d3+1] = self.gl_coord[s3+1]
-                    coord[d3+2] = self.gl_coord[s3+2]
-
-                    norm[d3] = self.gl_norm[s3]
-                    norm[d3+1] = self.gl_norm[s3+1]
-                    norm[d3+2] = self.gl_norm[s3+2]
-
-                    gl_uvcoord[d2] = self.gl_uvcoord[s2]
-                    gl_uvcoord[d2+1] = self.gl_uvcoord[s2+1]
-
-            for i in range(0, len(faceverts)):
-                faceverts[i] = mapping[faceverts[i]]
+            mapping, coord, norm, gl_uvcoord = self.compactVerts(mask)
+            faceverts[:] = mapping[faceverts]
+            weights = self.compactWeights(mapping, bweights)
 
             overflow = self.shortenOverflow(mapping)
             if overflow is not None:
-                mx = overflow.min(axis=0)[1]
-                coord = np.resize(coord, mx * 3)
-                norm = np.resize(norm, mx * 3)
+                if len(overflow) > 0:
+                    mx = overflow.min(axis=0)[1]
+                    coord = np.resize(coord, mx * 3)
+                    norm = np.resize(norm, mx * 3)
             else:
                 overflow   =   self.overflow
         else:
@@ -396,46 +501,111 @@ class object3d:
             norm  = np.resize(np.copy(self.gl_norm), mx * 3)
             gl_uvcoord = self.gl_uvcoord
             overflow   =   self.overflow
+            weights = bweights
 
-        return (coord, norm, gl_uvcoord, vertsperface, faceverts, overflow)
+        return (coord, norm, gl_uvcoord, vertsperface, faceverts, overflow, weights)
+
+    def getGroups(self):
+        """
+        faces per group as lists (used for exports), created from the flat arrays when needed
+        """
+        if self.loadedgroups is None and self.groupinfo is not None:
+            verts = self.faceverts.tolist()
+            fsize = self.vertsperface.tolist()
+            groups = {}
+            j = 0
+            for num, elem in enumerate(self.groupinfo.tolist()):
+                fs = elem[0]
+                f = []
+                for i in range(elem[1]):
+                    f.append(verts[fs:fs+fsize[j]])
+                    fs += fsize[j]
+                    j += 1
+                groups[self.npGrpNames[num].decode("utf-8")] = { "v": f, "uv": elem[2] }
+            self.loadedgroups = groups
+        return (self.loadedgroups)
+
+    def getFlatFaces(self):
+        """
+        flat face description: groupinfo (start in faceverts, number of faces, uv), vertsperface, faceverts
+        """
+        return (self.groupinfo, self.vertsperface, self.faceverts)
 
-    def createGLFaces(self, nfaces, ufaces, prim, groups):
-        self.loadedgroups = groups
+    def triangulateFaces(self, vertsperface, faceverts):
+        """
+        fan triangulation of all faces at once, face (v0, v1, v2, v3 ...) becomes (v0, v1, v2), (v0, v2, v3) ...
+        returns triangles as [n, 3] array of uint32 and the original face number per triangle
+        """
+        # numpy: simulates this loop
+        # for face in faces:
+        #    for i in range(1, len(face)-1):
+        #        fverts.append([face[0], face[i], face[i+1]])
+        #        trifaces.append(facenumber)
+        #
+        ntris = np.maximum(np.asarray(vertsperface, dtype=np.int64) - 2, 0)
+        fstart = np.cumsum(vertsperface, dtype=np.int64) - vertsperface
+        tstart = np.cumsum(ntris) - ntris
+        trifaces = np.repeat(np.arange(len(ntris), dtype=np.uint32), ntris)
+        first = fstart[trifaces]
+        step = np.arange(len(first)) - tstart[trifaces]
+
+        fverts = np.empty((len(first), 3), dtype=np.uint32)
+        fverts[:,0] = faceverts[first]
+        fverts[:,1] = faceverts[first + step + 1]
+        fverts[:,2] = faceverts[first + step + 2]
+        return (fverts, trifaces)
+
+    def createGLFaces(self, nfaces, ufaces, prim, groupinfo, vertsperface, faceverts, fverts=None):
+        """
+        create faces from the flat face description, no lists per face are created
+
+        :param groupinfo: per group start in faceverts, number of faces, uv
+        :param vertsperface: number of vertices per face
+        :param faceverts: vertex numbers of all faces (groupwise)
+        :param fverts: triangles of all groups (binary files), if None, they are calculated
+        """
+        self.loadedgroups = None
+        self.groupinfo = groupinfo
+        self.vertsperface = vertsperface
+        self.faceverts = faceverts
         self.prim = prim
         self.n_faces = nfaces
         self.n_fuvs =  ufaces
-        self.group = np.zeros(nfaces, dtype=np.uint16)
 
-        self.fverts = np.zeros((self.prim, 3), dtype=np.uint32)
-        # fill faces and group buffer
-        # ( array of numbers per face determining the group-number )
+        # group number per face
+        #
+        lfaces = groupinfo['f1'].astype(np.int64)
+        self.group = np.repeat(np.arange(len(lfaces), dtype=np.uint16), lfaces)
 
-        cnt = 0
-        for num, npelem in enumerate (self.npGrpNames):
-            elem = npelem.decode("utf-8")
-            if self.visible is not None and elem not in self.visible:
-                continue
-            faces = groups[elem]["v"]
-            for face in faces:
-                l = len(face)
-                self.fverts[cnt] = face[:3]
-                cnt += 1
-                # rest for quad and n-gons 
-                if l > 3:
-                    i=2
-                    while i < l-1:
-                        self.fverts[cnt] = [face[0], face[i], face[i+1]]
-                        cnt += 1
-                        i += 1
-
-        # resize to visible groups only TODO not sure if it should stay like this
+        if fverts is None:
+            (fverts, trifaces) = self.triangulateFaces(vertsperface, faceverts)
+        else:
+            fverts = np.reshape(fverts, (-1, 3))
+            ntris = np.maximum(np.asarray(vertsperface, dtype=np.int64) - 2, 0)
+            trifaces = np.repeat(np.arange(len(ntris), dtype=np.uint32), ntris)
+
+        # only triangles of visible groups
         #
-        self.fverts.resize((cnt, 3), refcheck=False)
-        self.n_fverts = cnt * 3
+        if self.visible is not None:
+            visible = np.array([npelem.decode("utf-8") in self.visible for npelem in self.npGrpNames], dtype=bool)
+            if not visible.all():
+                used = visible[self.group[trifaces]]
+                fverts = fverts[used]
+                trifaces = trifaces[used]
+
+        self.fverts = fverts
+        self.trifaces = trifaces
+        self.createGLBuffers()
 
-        # the indices (icoord) are simply the flattened fverts of the triangles
+    def createGLBuffers(self):
+        """
+        create OpenGL buffers from triangles, coordinates and uvs
+        """
+        self.n_fverts = len(self.fverts) * 3
+
+        # the indices (icoord) are simply the flattened fverts of the triangles (a view, no copy)
         #
-        self.gl_icoord =  self.fverts.copy().reshape(self.n_fverts) # Numpy 2.1 supports option copy here
+        self.gl_icoord =  self.fverts.reshape(self.n_fverts)
 
         self.gl_coord = self.coord.flatten()
         self.gl_coord_o = self.gl_coord.copy()  # create a copy for original values
@@ -484,63 +654,44 @@ class object3d:
         self.gl_coord[:] = self.gl_coord_w[:]
 
     def hideVertices(self, verts):
-        numind = len(self.gl_icoord) -2
+        """
+        create an index without the triangles where all 3 vertices are hidden
+        """
         w = np.resize(verts, self.n_verts)
         #
         # bool copy to end
         #
-        for (source, dest) in self.overflow:
-            w[dest] = w[source]
-        #
-        self.gl_hicoord = np.zeros(len(self.gl_icoord), dtype=np.uint32)
-        scnt = 0
-        dcnt = 0
-        while scnt < numind:
+        # for (source, dest) in self.overflow:
+        #    w[dest] = w[source]
+        w[self.overflow[:,1]] = w[self.overflow[:,0]]
 
-            # if all 3 verts are false, triangle is created
-            #
-            if not (w[self.gl_icoord[scnt]] and w[self.gl_icoord[scnt+1]] and w[self.gl_icoord[scnt+2]]):
-                self.gl_hicoord[dcnt:dcnt+3] = self.gl_icoord[scnt:scnt+3]
-                dcnt += 3
-            scnt += 3
-        self.gl_hicoord.resize(dcnt, refcheck=False)
+        # numpy: triangle is created, if not all 3 verts are hidden
+        #
+        tri = np.reshape(self.gl_icoord[:len(self.gl_icoord) // 3 * 3], (-1, 3))
+        self.gl_hicoord = tri[~np.all(w[tri], axis=1)].ravel()
 
     def hideApproxVertices(self, asset, base, verts):
-        self.gl_hicoord = np.zeros(len(self.gl_icoord), dtype=np.uint32)
-        scnt = 0
-        dcnt = 0
-
+        """
+        create an index without the triangles where all 3 vertices are hidden, a vertex of the asset is hidden,
+        when all 3 reference vertices of the base are hidden
+        """
         w = np.resize(verts, base.n_verts)
-        for (source, dest) in base.overflow:
-            w[dest] = w[source]
+        w[base.overflow[:,1]] = w[base.overflow[:,0]]
 
         ref = np.resize(asset.ref_vIdxs,(self.n_verts,3))
-        for (source, dest) in self.overflow:
-            ref[dest] = ref[source]
-
-        numind = len(self.gl_icoord) -2
-        while scnt < numind:
-            n1 = self.gl_icoord[scnt]
-            n2 = self.gl_icoord[scnt+1]
-            n3 = self.gl_icoord[scnt+2]
-            if not (  w[ref[n1][0]] and w[ref[n1][1]] and  w[ref[n1][2]] and \
-                    w[ref[n2][0]] and w[ref[n2][1]] and  w[ref[n2][2]] and \
-                    w[ref[n3][0]] and w[ref[n3][1]] and  w[ref[n3][2]] ):
-                self.gl_hicoord[dcnt:dcnt+3] = self.gl_icoord[scnt:scnt+3]
-                dcnt += 3
-            scnt += 3
-        self.gl_hicoord.resize(dcnt, refcheck=False)
+        ref[self.overflow[:,1]] = ref[self.overflow[:,0]]
+
+        hidden = np.all(w[ref], axis=1)
+        tri = np.reshape(self.gl_icoord[:len(self.gl_icoord) // 3 * 3], (-1, 3))
+        self.gl_hicoord = tri[~np.all(hidden[tri], axis=1)].ravel()
 
     def hiddenMask(self):
         if self.gl_hicoord is None:
             return None
 
-        indlen = len(self.gl_hicoord)
-
         usedmax = len(self.gl_uvcoord) // 2
         ba = np.full((usedmax), 0)
-        for cnt in range(0, indlen):
-            ba[self.gl_hicoord[cnt]] = 1
+        ba[self.gl_hicoord] = 1
 
         # nothing deleted?
         if np.all(ba):
@@ -552,14 +703,15 @@ class object3d:
         """
         creates a mapping index reduced by hidden coords + highest value
         """
-        usedmax = len(mask)
-        mapping = np.full(usedmax, -1, dtype=np.int32)
-        fill = 0
-        for cnt in range(0, usedmax):
-            if mask[cnt] == 1:
-                mapping[cnt] = fill
-                fill +=1
-        return(mapping, fill)
+        # numpy: running number of used coords, -1 for the others
+        # for cnt in range(0, usedmax):
+        #    if mask[cnt] == 1:
+        #        mapping[cnt] = fill
+        #        fill +=1
+        #
+        used = (mask == 1)
+        mapping = np.where(used, np.cumsum(used) - 1, -1).astype(np.int32)
+        return(mapping, int(np.count_nonzero(used)))
 
     def optimizeHiddenMesh(self, bweights):
         """
@@ -579,66 +731,11 @@ class object3d:
         # so this creates a shorter version already
         # return self.gl_hicoord, self.gl_coord, self.gl_uvcoord, self.gl_norm
 
-        # create a mapping index reduced by hidden coords
-        #
-        usedmax = len(mask)
-        mapping, newcoord = self.createMapping(mask)
-
-        # we now know size, so create temporary arrays
-        #
-        indlen = len(self.gl_hicoord)
-        gl_index = np.zeros(indlen, dtype=np.uint32)
-        gl_coord = np.zeros(newcoord*3,  dtype=np.float32)
-        gl_uvcoord = np.zeros(newcoord*2,  dtype=np.float32)
-        gl_norm = np.zeros(newcoord*3,  dtype=np.float32)
-
-        # do correction of flattened array
+        # create a mapping index reduced by hidden coords, copy used values
         #
-        for cnt in range(0, usedmax):
-            d = mapping[cnt]
-            if d != -1:
-                s2 = cnt * 2
-                s3 = cnt * 3
-                d2 = d * 2
-                d3 = d * 3
-
-                gl_coord[d3] = self.gl_coord[s3]
-                gl_coord[d3+1] = self.gl_coord[s3+1]
-                gl_coord[d3+2] = self.gl_coord[s3+2]
-
-                gl_uvcoord[d2] = self.gl_uvcoord[s2]
-                gl_uvcoord[d2+1] = self.gl_uvcoord[s2+1]
-
-                gl_norm[d3] = self.gl_norm[s3]
-                gl_norm[d3+1] = self.gl_norm[s3+1]
-                gl_norm[d3+2] = self.gl_norm[s3+2]
-
-        for cnt in range(0,  indlen):
-            gl_index[cnt] =  mapping[self.gl_hicoord[cnt]]
-
-        if bweights is not None:
-
-            print ("need to optimize weights")
-            # vertex numbers of weights index array must be replaced by new numbers,
-            # the needed weights will be copied
-            #
-            nweights = {}
-            for elem in bweights:
-                narr = []
-                warr = []
-                m = 0
-                for i, n in enumerate(bweights[elem][0]):
-                    d = mapping[n]
-                    if d != -1:
-                        narr.append(d)
-                        warr.append(bweights[elem][1][i])
-                        m += 1
-
-                if m > 0:
-                    nweights[elem] = (np.array(narr, dtype=np.uint32), np.array(warr, dtype=np.float32))
-        else:
-            nweights = None
-
+        mapping, gl_coord, gl_norm, gl_uvcoord = self.compactVerts(mask)
+        gl_index = mapping[self.gl_hicoord].astype(np.uint32)
+        nweights = self.compactWeights(mapping, bweights)
         overflow = self.shortenOverflow(mapping)
 
         return gl_index, gl_coord, gl_uvcoord, gl_norm, nweights, overflow
@@ -655,17 +752,16 @@ class object3d:
             if factor < 0.0:
                 if targetlower is None:
                     return
-                verts = targetlower.verts
-                data  = targetlower.data
+                target = targetlower
                 factor = -factor
             elif factor > 0.0:
-                verts = targetupper.verts
-                data  = targetupper.data
-            for i in range(0, len(verts)):
-                x = verts[i] * 3
-                self.gl_coord_w[x]   = self.gl_coord[x]   - factor * data[i][0]
-                self.gl_coord_w[x+1] = self.gl_coord[x+1] - factor * data[i][1]
-                self.gl_coord_w[x+2] = self.gl_coord[x+2] - factor * data[i][2]
+                if targetupper is None:
+                    return
+                target = targetupper
+
+            # remove this target from the copy, a single row of the morph engine
+            #
+            self.glob.Targets.engine.axpy(self.gl_coord_w, self.gl_coord, target, -factor)
 
         self.overflowCorrection(self.gl_coord_w)
         # self.calcNormals()
@@ -676,64 +772,50 @@ class object3d:
         """
         if factor == 0.0:
             self.gl_coord[:] = self.gl_coord_w[:]
+            self.updateTargetNormals(targetlower, targetupper)
             return
 
         if factor < 0.0:
             if targetlower is None:
                 return
-            verts = targetlower.verts * 3
-            data  = targetlower.data.ravel()
+            target = targetlower
             factor = -factor
         elif factor > 0.0:
-            verts = targetupper.verts * 3
-            data  = targetupper.data.ravel()
+            if targetupper is None:
+                return
+            target = targetupper
 
-        srcVerts = np.s_[...]
-        self.gl_coord[verts] = self.gl_coord_w[verts] + data[srcVerts][::3] * factor
-        self.gl_coord[verts+1] = self.gl_coord_w[verts+1] + data[srcVerts][1::3] * factor
-        self.gl_coord[verts+2] = self.gl_coord_w[verts+2] + data[srcVerts][2::3] * factor
+        # one sparse row of the morph engine added to working copy
+        #
+        self.glob.Targets.engine.axpy(self.gl_coord, self.gl_coord_w, target, factor)
 
         # overflow vertices
         #
         self.overflowCorrection(self.gl_coord)
+        self.updateTargetNormals(targetlower, targetupper)
 
-    def setTarget(self, factor, targetlower, targetupper):
+    def updateTargetNormals(self, targetlower, targetupper):
         """
-        updates from file (all done on basemesh directly)
-        no overflow correction
+        new normals for the vertices of both targets (slider might have changed direction)
         """
-        if factor < 0.0:
-            if targetlower is None:
-                return
-            verts = targetlower.verts * 3
-            data  = targetlower.data.ravel()
-            factor = -factor
-        elif factor > 0.0:
-            if targetupper is None:
-                return
-            verts = targetupper.verts * 3
-            data  = targetupper.data.ravel()
-
-        srcVerts = np.s_[...]
-        self.gl_coord[verts] += data[srcVerts][::3] * factor
-        self.gl_coord[verts+1] += data[srcVerts][1::3] * factor
-        self.gl_coord[verts+2] += data[srcVerts][2::3] * factor
+        verts = [target.verts for target in (targetlower, targetupper) if target is not None and target.loaded]
+        if len(verts) > 0:
+            self.updateNormals(np.concatenate(verts))
 
     def addAllNonMacroTargets(self):
         """
         copy original mesh + add all changes of non-macrotargets
+        (gl_coord = gl_coord_o + W @ D, done by the morph engine)
         """
         print ("+++ Add all non Macro Targets to buffer")
-        self.resetMesh()
-        targets = self.glob.Targets.modelling_targets
-        for target in targets:
-            if target.value != 0.0 and target.macro is None:
-                # print ("Set " + target.name)
-                self.setTarget(target.value / 100, target.decr, target.incr)
+        engine = self.glob.Targets.engine
+        engine.setWeightsFromModelling(self.glob.Targets.modelling_targets)
+        engine.apply(self.gl_coord_o, self.gl_coord)
 
         # overflow vertices
         #
         self.overflowCorrection(self.gl_coord)
+        self.updateNormals()
 
     def prepareMacroBuffer(self):
         """
@@ -741,43 +823,45 @@ class object3d:
         """
         print ("+++ Prepare Buffer")
         self.gl_coord_mn =  self.gl_coord.copy()
-        self.gl_coord_mm = np.zeros_like(self.gl_coord)
+        self.gl_coord_mm = np.zeros_like(self.gl_coord, dtype=np.float64)   # float64, because changes are accumulated
 
 
-    def addTargetToMacroBuffer(self, factor, target):
+    def addTargetsToMacroBuffer(self, factors, targets):
         """
-        updates a special buffer for a macro target
+        updates the macro buffer with a list of targets in one step
         """
-        m = target.data.ravel()
-        verts = target.verts * 3
-
-        srcVerts = np.s_[...]
-        self.gl_coord_mm[verts] += m[srcVerts][::3] * factor
-        self.gl_coord_mm[verts+1] += m[srcVerts][1::3] * factor
-        self.gl_coord_mm[verts+2] += m[srcVerts][2::3] * factor
+        if len(targets) == 0:
+            return
+        verts = np.concatenate([target.verts for target in targets]).astype(np.int64)
+        data = np.concatenate([np.reshape(target.data, (-1, 3)) * factor for factor, target in zip(factors, targets)])
 
+        # numpy: column index for x, y, z of each vertex
+        #
+        cols = (verts[:, None] * 3 + np.arange(3)).ravel()
+        self.gl_coord_mm += np.bincount(cols, weights=data.ravel(), minlength=len(self.gl_coord_mm))
 
     def addMacroBuffer(self):
         """
         after changing a macro it will be added
         make sure to write in same buffer (out will avoid to get a new one)
+        the macro buffer is kept, following changes are added to it
         """
         print ("+++ Add macro to character")
-        np.add(self.gl_coord_mm, self.gl_coord_mn, out=self.gl_coord)  
+        np.add(self.gl_coord_mm, self.gl_coord_mn, out=self.gl_coord, casting="same_kind")
         self.overflowCorrection(self.gl_coord)
-        self.gl_coord_mm = np.zeros_like(self.gl_coord)
+        self.updateNormals()
 
-    def approxToBasemesh(self, asset, base):
+    def approxToBasemesh(self, asset, base, rows=None):
         """
         updates the mesh, barycentric approximation (assets)
+
+        :param rows: only these vertices (rows of ref_vIdxs) are recalculated, None = all
         """
 
-        b = base.gl_coord
+        b = np.reshape(base.gl_coord, (-1, 3))
         w = asset.weights
         o = asset.offsets
 
-        verts = asset.ref_vIdxs * 3 # index (v0, v1, v2)
-
         """
         i = 0
         j = 0
@@ -788,22 +872,27 @@ class object3d:
             i += 3
             j += 1
 
+        numpy: one gather of the 3 reference vertices [m, 3, 3] (np.take is faster than fancy indexing),
+        weighted sum written directly into the coordinates (view as [n, 3]), then the (scaled) offsets are added
         """
-        vlen = len(verts)
-
-        if asset.scaleMat is not None:
-            (x, y, z)  = (asset.scaleMat[0,0], asset.scaleMat[1,1], asset.scaleMat[2,2])
-            self.gl_coord[:vlen*3:3]  = w[:,0]*b[verts[:,0]] + w[:,1]*b[verts[:,1]] +  w[:,2]*b[verts[:,2]] + o[:,0] * x
-            self.gl_coord[1:vlen*3:3] = w[:,0]*b[verts[:,0]+1] + w[:,1]*b[verts[:,1]+1] +  w[:,2]*b[verts[:,2]+1] + o[:,1] * y
-            self.gl_coord[2:vlen*3:3] = w[:,0]*b[verts[:,0]+2] + w[:,1]*b[verts[:,1]+2] +  w[:,2]*b[verts[:,2]+2] + o[:,2] * z
+        scale = np.diagonal(asset.scaleMat) if asset.scaleMat is not None else 1.0
+        if rows is None:
+            vlen = len(asset.ref_vIdxs)
+            coord = np.reshape(self.gl_coord, (-1, 3))[:vlen]
+            np.einsum('ij,ijk->ik', w, np.take(b, asset.ref_vIdxs, axis=0), out=coord)
+            coord += o * scale
         else:
-            self.gl_coord[:vlen*3:3]  = w[:,0]*b[verts[:,0]] + w[:,1]*b[verts[:,1]] +  w[:,2]*b[verts[:,2]] + o[:,0]
-            self.gl_coord[1:vlen*3:3] = w[:,0]*b[verts[:,0]+1] + w[:,1]*b[verts[:,1]+1] +  w[:,2]*b[verts[:,2]+1] + o[:,1]
-            self.gl_coord[2:vlen*3:3] = w[:,0]*b[verts[:,0]+2] + w[:,1]*b[verts[:,1]+2] +  w[:,2]*b[verts[:,2]+2] + o[:,2]
+            # only changed rows
+            #
+            coord = np.reshape(self.gl_coord, (-1, 3))
+            part = np.einsum('ij,ijk->ik', w[rows], np.take(b, asset.ref_vIdxs[rows], axis=0))
+            part += o[rows] * scale
+            coord[rows] = part
 
         # do not forget the overflow vertices
         #
         self.overflowCorrection(self.gl_coord)
+        self.updateNormals(rows)
 
 
     def precalculateApproxInRestPose(self, asset, base):
@@ -2,6 +2,79 @@ import numpy as np
 from obj3d.bone import cBone, boneWeights
 import core.math as mquat
 
+class fkSolver():
+    """
+    batched forward kinematics, the skeleton is stored as arrays in order of the bones (parents before children)
+    rest matrices and their inverse are calculated once, pose matrices are evaluated level by level
+    all functions accept additional leading dimensions (e.g. frames)
+    """
+    def __init__(self, bones):
+        self.names = list(bones)
+        self.index = {name: num for num, name in enumerate(self.names)}
+        blist = [bones[name] for name in self.names]
+        n = len(blist)
+
+        self.parent = np.asarray([self.index[b.parent.name] if b.parent is not None else -1 for b in blist], dtype=np.int64)
+        level = np.asarray([b.level for b in blist], dtype=np.int64)
+        self.levels = [np.flatnonzero(level == l) for l in range(int(level.max()) + 1)] if n > 0 else []
+
+        self.restGlobal = np.asarray([b.matRestGlobal for b in blist], dtype=np.float32).reshape(n, 4, 4)
+        self.restLocal = np.asarray([b.matRestLocal for b in blist], dtype=np.float32).reshape(n, 4, 4)
+        self.restGlobalInv = np.linalg.inv(self.restGlobal)
+
+        # joint positions as homogeneous coordinates
+        #
+        self.heads = np.ones((n, 4), dtype=np.float32)
+        self.tails = np.ones((n, 4), dtype=np.float32)
+        self.heads[:,:3] = [b.headPos for b in blist]
+        self.tails[:,:3] = [b.tailPos for b in blist]
+
+    def localPoseMatrices(self, poses, index):
+        """
+        local pose matrices from rotation + translation matrices (e.g. BVH), same as cBone.calcLocalPoseMat
+
+        :param poses: array (..., m, 3, 4) or (..., m, 3, 3)
+        :param index: bone number for each of the m matrices
+        :return: array (..., m, 4, 4)
+        """
+        poses = np.asarray(poses, dtype=np.float32)
+        rest = self.restGlobal[index]
+        inv = self.restGlobalInv[index]
+        local = np.zeros(poses.shape[:-2] + (4, 4), dtype=np.float32)
+
+        # numpy: invRest * rotation * rest, translation in bone-local axis directions
+        #
+        local[...,:3,:3] = inv[:,:3,:3] @ poses[...,:3,:3] @ rest[:,:3,:3]
+        if poses.shape[-1] == 4:
+            local[...,:3,3] = (inv[:,:3,:3] @ poses[...,:3,3,None])[...,0]
+        local[...,3,3] = 1.0
+        return (local)
+
+    def globalPoseMatrices(self, local):
+        """
+        global pose matrices and pose verts matrices from local pose matrices
+
+        :param local: array (..., bones, 4, 4)
+        :return: global pose matrices, pose verts matrices (both as local)
+        """
+        glob = np.empty_like(local)
+        for num, idx in enumerate(self.levels):
+            mats = self.restLocal[idx] @ local[...,idx,:,:]
+            if num == 0:
+                glob[...,idx,:,:] = mats
+            else:
+                glob[...,idx,:,:] = glob[...,self.parent[idx],:,:] @ mats
+        return (glob, glob @ self.restGlobalInv)
+
+    def posedJoints(self, poseverts):
+        """
+        head and tail positions, same as cBone.poseBone
+        """
+        heads = (poseverts[...,:3,:] @ self.heads[:,:,None])[...,0]
+        tails = (poseverts[...,:3,:] @ self.tails[:,:,None])[...,0]
+        return (heads, tails)
+
+
 class skeleton:
     def __init__(self, glob, name):
         self.glob = glob
@@ -17,6 +90,7 @@ class skeleton:
         self.root = None     # our skeleton accepts one root bone, not more
         self.mesh = self.glob.baseClass.baseMesh
         self.filename = None
+        self.fk = None       # forward kinematics, created on first use
 
     def loadJSON(self, path):
         json = self.env.readJSON(path)
@@ -170,6 +244,97 @@ class skeleton:
     def calcRestMat(self):
         for bone in self.bones:
             self.bones[bone].calcRestMatFromSkeleton()
+        self.fk = None
+
+    def getFKSolver(self):
+        """
+        solver for batched forward kinematics, None when a rest matrix is not invertible
+        """
+        if self.fk is None:
+            try:
+                self.fk = fkSolver(self.bones)
+            except np.linalg.LinAlgError:
+                self.env.logLine(1, "Cannot calculate pose verts matrices, non-singular rest matrix in " + self.name)
+                return None
+        return (self.fk)
+
+    def jointIndex(self, joints):
+        """
+        bone numbers of the joints used by the skeleton and the joints
+        """
+        fk = self.fk
+        used = [name for name in joints if name in fk.index]
+        return (np.asarray([fk.index[name] for name in used], dtype=np.int64), [joints[name] for name in used])
+
+    def setPoseMatrices(self, local, changed=None):
+        """
+        evaluate global pose matrices for local matrices of all bones and assign them to the bones
+
+        :param local: array (bones, 4, 4)
+        :param changed: bone numbers where local matrix changed (None = all)
+        """
+        fk = self.fk
+        (glob, poseverts) = fk.globalPoseMatrices(local)
+        self.assignPoseMatrices(glob, poseverts)
+        for num in (range(len(fk.names)) if changed is None else changed):
+            self.bones[fk.names[num]].matPoseLocal = local[num]
+
+    def assignPoseMatrices(self, glob, poseverts):
+        """
+        assign global pose matrices and pose verts matrices (both array (bones, 4, 4)) to the bones
+        """
+        fk = self.fk
+        (heads, tails) = fk.posedJoints(poseverts)
+        for num, name in enumerate(fk.names):
+            bone = self.bones[name]
+            bone.matPoseGlobal = glob[num]
+            bone.matPoseVerts = poseverts[num]
+            bone.poseheadPos = heads[num]
+            bone.posetailPos = tails[num]
+
+    def currentLocalPoseMatrices(self):
+        return (np.asarray([self.bones[name].matPoseLocal for name in self.fk.names], dtype=np.float32))
+
+    def poseFrames(self, joints, frames, matrices=None):
+        """
+        evaluate pose matrices for many frames at once (e.g. for export), bones are not changed
+        bones without joint keep their current local pose
+
+        :param joints: joints of BVH
+        :param frames: list or array of rows in matrixPoses (see BVH.frameRange)
+        :param matrices: dictionary joint name: matrices used instead of matrixPoses of the joints (see BVH.frameMatrices)
+        :return: global pose matrices, pose verts matrices, both as array (frames, bones, 4, 4)
+        """
+        fk = self.getFKSolver()
+        if fk is None:
+            return (None, None)
+
+        frames = np.asarray(frames, dtype=np.int64)
+        (index, used) = self.jointIndex(joints)
+        local = np.repeat(self.currentLocalPoseMatrices()[None], len(frames), axis=0)
+        if len(used) > 0:
+            source = [joint.matrixPoses if matrices is None else matrices[joint.name] for joint in used]
+            poses = np.stack([m[frames] for m in source], axis=1)
+            local[:,index] = fk.localPoseMatrices(poses, index)
+        return (fk.globalPoseMatrices(local))
+
+    def blendFrames(self, blends, ratios):
+        """
+        evaluate pose matrices for many variants of an expression at once, bones are not changed
+
+        :param blends: list of [face unit name, weight in percent], weight is not used
+        :param ratios: weights (1.0 = full pose) as array (variants, units)
+        :return: global pose matrices, pose verts matrices, both as array (variants, bones, 4, 4)
+        """
+        fk = self.getFKSolver()
+        faceunits = self.glob.baseClass.getFaceUnits()
+        if fk is None or faceunits is None:
+            return (None, None)
+
+        ratios = np.asarray(ratios, dtype=np.float64)
+        local = np.repeat(self.currentLocalPoseMatrices()[None], len(ratios), axis=0)
+        self.blendLocalPoseMatrices(faceunits, blends, ratios, local)
+        return (fk.globalPoseMatrices(local))
 
     def newGeometry(self):
         """
@@ -192,34 +357,53 @@ class skeleton:
     def skinBasemesh(self):
         self.skinMesh(self.mesh, self.bWeights)
 
-    def skinMesh(self, mesh, bWeights):
-        vmapping = bWeights.bWeights
+    def poseMatrices(self, bones):
+        """
+        first 3 rows of the pose matrices of the bones as one array (bones, 12)
+        """
+        mats = np.empty((len(bones), 12), dtype=np.float32)
+        for num, bname in enumerate(bones):
+            mats[num] = self.bones[bname].matPoseVerts[:3].ravel()
+        return (mats)
 
-        coords = np.zeros((mesh.n_origverts,3), float)        # own vector
-        l = len(mesh.gl_coord) // 3
+    def skinCoords(self, mesh, table, mats, coords):
+        """
+        skin a mesh into an array of coordinates (same size as gl_coord), the mesh itself is not changed
+        dual quaternion skinning when selected for the character, unweighted vertices are set to 0
 
-        meshCoords = np.ones((l, 4), dtype=np.float32)
-        meshCoords[:,:3] = np.reshape(mesh.gl_coord_w, (l,3))
+        :param table: skin table of the mesh, see boneWeights.getSkinTable
+        :param mats: array (bones, 12), see poseMatrices
+        """
+        l = len(mesh.gl_coord) // 3
+        source = np.reshape(mesh.gl_coord_w, (l,3))
 
-        for bname in vmapping:
-            bone = self.bones[bname]
+        if self.glob.baseClass.skinning == "dualquaternion":
+            dquats = mquat.dualQuaternionsFromMatrices(mats.reshape(-1, 3, 4))
+            result = table.transformDualQuat(dquats.astype(np.float32), source)
+        else:
+            # numpy: for each bone: coords[verts] += (matPoseVerts * meshCoords[verts]) * weights
+            #
+            result = table.transform(mats, source)
 
-            verts, weights = vmapping[bname]
-            vec = np.dot(bone.matPoseVerts, meshCoords[verts].transpose())
-            vec *= weights
-            coords[verts] += vec.transpose()[:,:3]
+        dest = np.reshape(coords, (l,3))
+        dest[table.verts] = result
+        dest[table.unweighted] = 0.0
+        mesh.overflowCorrection(coords)
 
-        m = coords.flatten()
-        mesh.gl_coord[:mesh.n_origverts*3] = m[:]
-        mesh.overflowCorrection(mesh.gl_coord)
+    def skinMesh(self, mesh, bWeights):
+        """
+        linear blend skinning or dual quaternion skinning, bone matrices are blended per vertex and applied in one step
+        """
+        table = bWeights.getSkinTable()
+        self.skinCoords(mesh, table, self.poseMatrices(table.bones), mesh.gl_coord)
+        mesh.updateNormals()
 
 
     def restPose(self, bones_only=False):
-        for bone in self.bones:
-            self.bones[bone].restPose()
-            if self.bones[bone].calcGlobalPoseMat() is False:
-                return False
-            self.bones[bone].poseBone()
+        if self.getFKSolver() is None:
+            return False
+
+        self.setPoseMatrices(np.repeat(np.identity(4, dtype=np.float32)[None], len(self.fk.names), axis=0))
 
         # in case of restpose, pose with update function and not with pose function
         #
@@ -228,59 +412,73 @@ class skeleton:
             self.glob.baseClass.updateAttachedAssets()
 
     def pose(self, joints, num=0, bones_only=False):
-        for elem in self.bones:
-            if elem in joints:
-                self.bones[elem].calcLocalPoseMat(joints[elem].matrixPoses[num])
+        """
+        pose by joints of BVH, all matrices are calculated in one step per level of hierarchy
+        bones without joint keep their local pose, num is the row in matrixPoses (see BVH.frame)
+        """
+        fk = self.getFKSolver()
+        if fk is None:
+            return False
 
-            if self.bones[elem].calcGlobalPoseMat() is False:
-                return False
-            self.bones[elem].poseBone()
+        (index, used) = self.jointIndex(joints)
+        local = self.currentLocalPoseMatrices()
+        if len(used) > 0:
+            poses = np.asarray([joint.matrixPoses[num] for joint in used], dtype=np.float32)
+            local[index] = fk.localPoseMatrices(poses, index)
+        self.setPoseMatrices(local, index)
 
         if not bones_only:
             self.skinBasemesh()
             self.glob.baseClass.poseAttachedAssets()
 
+    def blendLocalPoseMatrices(self, faceunits, blends, ratios, local, mask=None):
+        """
+        local pose matrices of the bones of face units
+
+        :param blends: list of [face unit name, weight in percent]
+        :param ratios: weights as array (variants, units) or None to use the weights of blends
+        :param local: local pose matrices, array (bones, 4, 4) or (variants, bones, 4, 4), will be changed
+        :param mask: bones set to rest position, when not used by blends
+        :return: bone numbers of changed bones
+        """
+        fk = self.fk
+        names = [blend[0] for blend in blends]
+        if ratios is None:
+            ratios = [blend[1] / 100 for blend in blends]
+        (quats, used) = faceunits.blendQuaternions(names, ratios)
+
+        # bones of face units available in skeleton
+        #
+        columns = [num for num, bone in enumerate(faceunits.bonemask) if used[num] and bone in fk.index]
+        index = np.asarray([fk.index[faceunits.bonemask[num]] for num in columns], dtype=np.int64)
+        if len(columns) > 0:
+            mats = mquat.quaternionsToRotMatrices(quats[...,columns,:])
+            local[...,index,:,:] = fk.localPoseMatrices(mats, index)
+
+        changed = list(index)
+        if mask is not None:
+            found = set(faceunits.bonemask[num] for num in columns)
+            rest = [fk.index[bone] for bone in mask if bone not in found and bone in fk.index]
+            local[...,rest,:,:] = np.identity(4, dtype=np.float32)
+            changed.extend(rest)
+        return (changed)
+
     def posebyBlends(self, blends, mask, bones_only=False):
         """
         function used for expressions, with mask set all unchanged bones will be set to rest position
+        blends is a list of [face unit name, weight in percent], all bones are calculated in one step
         """
         if len(blends) == 0:
             return
 
-        # check bonewise if blend is used, then use quaternionsSlerpFromMatrix with ratio to pose
-        # in case the bone is posed by more than one posemat, multiply quaternion matrices
-        #
-        found = {}
-        for bone in self.bones:
-            modbone = False
-            for blend in blends:
-                posemat = blend[0]
-                ratio = blend[1] / 100
-                if bone in posemat:
-                    found[bone] = True
-                    if modbone is True:
-                        q2 = mquat.quaternionSlerpFromMatrix(posemat[bone], ratio)
-                        q1 = mquat.quaternionMult(q1, q2)
-                    else:
-                        q1 = mquat.quaternionSlerpFromMatrix(posemat[bone], ratio)
-                    modbone = True
-
-            if modbone is True:
-                # print ("changed " + bone)
-                mat = mquat.quaternionToRotMatrix(q1)
-                self.bones[bone].calcLocalPoseMat(mat)
-
-            if self.bones[bone].calcGlobalPoseMat() is False:
-                return False
-            self.bones[bone].poseBone()
+        fk = self.getFKSolver()
+        faceunits = self.glob.baseClass.getFaceUnits()
+        if fk is None or faceunits is None:
+            return False
 
-        if mask is not None:
-            for bone in mask:
-                if bone not in found:
-                    self.bones[bone].restPose()
-                    if self.bones[bone].calcGlobalPoseMat() is False:
-                        return False
-                    self.bones[bone].poseBone()
+        local = self.currentLocalPoseMatrices()
+        changed = self.blendLocalPoseMatrices(faceunits, blends, None, local, mask)
+        self.setPoseMatrices(local, changed)
 
         if not bones_only:
             self.skinBasemesh()
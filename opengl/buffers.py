@@ -20,6 +20,9 @@ class OpenGlBuffers():
         self.tex_coord_buffer = None
         self.memory_pos = None
         self.len_memory = 0
+        self.memory_norm = None
+        self.unchanged = False      # skip next upload, mesh was not changed
+        self.changed = False        # mesh was changed, but not uploaded yet (overrides unchanged)
 
     def VertexBuffer(self, pos):
         vbuffer = QOpenGLBuffer(QOpenGLBuffer.VertexBuffer)
@@ -35,6 +38,8 @@ class OpenGlBuffers():
         vbuffer = QOpenGLBuffer()
         vbuffer.create()
         vbuffer.bind()
+        vbuffer.setUsagePattern(QOpenGLBuffer.DynamicDraw)
+        self.memory_norm = pos
         vbuffer.allocate(pos, len(pos) * 4)
         self.normal_buffer = vbuffer
 
@@ -71,8 +76,18 @@ class OpenGlBuffers():
             shader.enableAttributeArray(2)
 
     def Tweak(self):
+        """
+        stream positions and normals to the GPU (both arrays are changed in place)
+        """
+        skip = self.unchanged and not self.changed
+        self.unchanged = False
+        self.changed = False
+        if skip:
+            return
         self.vert_pos_buffer.bind()
         self.vert_pos_buffer.write(0,self.memory_pos, self.len_memory )
+        self.normal_buffer.bind()
+        self.normal_buffer.write(0,self.memory_norm, len(self.memory_norm) * 4)
 
     def Delete(self):
         if self.vert_pos_buffer is not None:
@@ -89,7 +89,9 @@ class OpenGLView(QOpenGLWidget):
         # this slows animation down, better way?
         #if self.framefeedback is not None:
         #    self.framefeedback()
-        skeleton.pose(bvh.joints, bvh.currentFrame, self.objects_invisible)
+        cache = self.glob.baseClass.animcache
+        if cache is None or not cache.showFrame(bvh.currentFrame, self.objects_invisible):
+            skeleton.pose(bvh.joints, bvh.frame(bvh.currentFrame), self.objects_invisible)
         if bvh.currentFrame < (bvh.frameCount-1):
             bvh.currentFrame += 1
         else:
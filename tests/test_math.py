@@ -0,0 +1,160 @@
+"""
+batched functions of core.math compared to the scalar versions
+
+run from the main folder with: python -m pytest tests
+"""
+import os
+import sys
+import math
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import core.math as mquat
+
+ORDERS = ["xyz", "xzy", "yzx", "yxz", "zxy", "zyx"]
+
+def randomQuaternions(rng, n):
+    q = rng.normal(size=(n, 4))
+    return (q / np.linalg.norm(q, axis=1)[:,None])
+
+def specialMatrices():
+    """
+    identity and rotations by 180 degrees around the axes, these use the other branches of quaternionFromMatrix
+    """
+    mats = [np.identity(4)]
+    for axis in ((1,0,0), (0,1,0), (0,0,1), (1,1,0), (0,1,1)):
+        mats.append(mquat.rotMatrix(math.pi, axis))
+    mats.append(mquat.rotMatrix(math.pi * 0.999, (1,0,0)))
+    mats.append(mquat.rotMatrix(1e-9, (0,0,1)))
+    return (np.asarray(mats))
+
+def sampleMatrices(rng, n=200):
+    angles = rng.uniform(-math.pi, math.pi, (n, 3))
+    mats = np.asarray([mquat.eulerMatrix(x, y, z) for (x, y, z) in angles])
+    return (np.concatenate((specialMatrices(), mats)))
+
+
+@pytest.fixture
+def rng():
+    return (np.random.default_rng(1234))
+
+@pytest.mark.parametrize("order", ORDERS)
+def test_eulerMatrices(rng, order):
+    angles = rng.uniform(-math.pi, math.pi, (100, 3))
+    angles[:3] = [[0, 0, 0], [math.pi, 0, 0], [0, math.pi/2, 0]]
+    batched = mquat.eulerMatrices(angles[:,0], angles[:,1], angles[:,2], order)
+    scalar = np.asarray([mquat.eulerMatrix(x, y, z, order)[:3,:3] for (x, y, z) in angles])
+    assert batched.shape == (100, 3, 3)
+    assert np.allclose(batched, scalar, atol=1e-12)
+
+def test_eulerMatricesShape(rng):
+    angles = rng.uniform(-math.pi, math.pi, (3, 4, 5))
+    batched = mquat.eulerMatrices(angles[0], angles[1], angles[2], "zxy")
+    assert batched.shape == (4, 5, 3, 3)
+    assert np.allclose(batched[2, 3], mquat.eulerMatrix(angles[0,2,3], angles[1,2,3], angles[2,2,3], "zxy")[:3,:3])
+
+def test_quaternionsFromMatrices(rng):
+    mats = sampleMatrices(rng)
+    batched = mquat.quaternionsFromMatrices(mats)
+    scalar = np.asarray([mquat.quaternionFromMatrix(m) for m in mats])
+    assert np.allclose(batched, scalar, atol=1e-6)
+    assert np.allclose(mquat.quaternionsFromMatrices(mats[:,:3,:3]), batched)
+    assert np.allclose(batched[0], [1, 0, 0, 0])
+
+def test_quaternionsToRotMatrices(rng):
+    q = np.concatenate((randomQuaternions(rng, 100) * 2.5, [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 0]]))
+    batched = mquat.quaternionsToRotMatrices(q)
+    scalar = np.asarray([mquat.quaternionToRotMatrix(x)[:3,:3] for x in q])
+    assert np.allclose(batched, scalar, atol=1e-12)
+    assert np.allclose(batched[-1], np.identity(3))
+
+def test_quaternionRoundTrip(rng):
+    mats = sampleMatrices(rng)
+    back = mquat.quaternionsToRotMatrices(mquat.quaternionsFromMatrices(mats))
+    assert np.allclose(back, mats[:,:3,:3], atol=1e-6)
+
+def test_quaternionsMult(rng):
+    q0 = randomQuaternions(rng, 100)
+    q1 = randomQuaternions(rng, 100)
+    q1[0] = [1, 0, 0, 0]
+    batched = mquat.quaternionsMult(q1, q0)
+    scalar = np.asarray([mquat.quaternionMult(a, b) for (a, b) in zip(q1, q0)])
+    assert np.allclose(batched, scalar, atol=1e-12)
+    assert np.allclose(mquat.quaternionsMult(q1[0], q0), q0)
+
+@pytest.mark.parametrize("shortestpath", [True, False])
+def test_quaternionsSlerp(rng, shortestpath):
+    n = 200
+    q0 = randomQuaternions(rng, n)
+    q1 = randomQuaternions(rng, n)
+    fraction = rng.uniform(0, 1, n)
+
+    # identical and opposite quaternions, endpoints, rotation by 180 degrees
+    #
+    q1[:5] = q0[:5]
+    q1[5:10] = -q0[5:10]
+    fraction[10:15] = 0.0
+    fraction[15:20] = 1.0
+    q0[20] = [1, 0, 0, 0]
+    q1[20] = [0, 1, 0, 0]
+    q0[21] = [1, 0, 0, 0]
+    q1[21] = [1e-9, 1, 0, 0]
+
+    batched = mquat.quaternionsSlerp(q0, q1, fraction, shortestpath)
+    scalar = np.asarray([mquat.quaternionSlerp(a, b, f, shortestpath) for (a, b, f) in zip(q0, q1, fraction)])
+    assert np.allclose(batched, scalar, atol=1e-12)
+    assert np.array_equal(batched[10:15], q0[10:15])
+    assert np.array_equal(batched[15:20], q1[15:20])
+
+def test_quaternionsSlerpBroadcast(rng):
+    q1 = randomQuaternions(rng, 10)
+    fraction = rng.uniform(0, 1, (4, 10))
+    identity = np.asarray([1.0, 0.0, 0.0, 0.0])
+    batched = mquat.quaternionsSlerp(identity, q1, fraction)
+    assert batched.shape == (4, 10, 4)
+    assert np.allclose(batched[3, 7], mquat.quaternionSlerp(identity, q1[7], fraction[3, 7]))
+
+def test_quaternionsSlerpFromMatrices(rng):
+    mats = sampleMatrices(rng)
+    fraction = rng.uniform(0, 1, len(mats))
+    fraction[:3] = [0.0, 1.0, 0.5]
+    batched = mquat.quaternionsSlerpFromMatrices(mats, fraction)
+    scalar = np.asarray([mquat.quaternionSlerpFromMatrix(m[:3,:3], f) for (m, f) in zip(mats, fraction)])
+    assert np.allclose(batched, scalar, atol=1e-6)
+
+def test_dualQuaternionsFromMatrices(rng):
+    mats = sampleMatrices(rng)
+    mats[:,:3,3] = rng.normal(size=(len(mats), 3))
+    dq = mquat.dualQuaternionsFromMatrices(mats)
+    assert np.allclose(dq[:,:4], mquat.quaternionsFromMatrices(mats))
+
+    # translation = 2 * dual * conjugate(real)
+    #
+    conj = dq[:,:4] * [1, -1, -1, -1]
+    trans = 2.0 * mquat.quaternionsMult(dq[:,4:], conj)
+    assert np.allclose(trans[:,0], 0.0, atol=1e-9)
+    assert np.allclose(trans[:,1:], mats[:,:3,3], atol=1e-9)
+
+def test_rotMatrices(rng):
+    angle = rng.uniform(-math.pi, math.pi, 100)
+    angle[:3] = [0.0, math.pi, -math.pi]
+    direction = rng.normal(size=(100, 3))
+    batched = mquat.rotMatrices(angle, direction)
+    scalar = np.asarray([mquat.rotMatrix(a, d) for (a, d) in zip(angle, direction)])
+    assert batched.shape == (100, 4, 4)
+    assert np.allclose(batched, scalar, atol=1e-6)
+    assert np.allclose(mquat.rotMatrices(angle, direction[0]), [mquat.rotMatrix(a, direction[0]) for a in angle], atol=1e-6)
+
+@pytest.mark.parametrize("orientation", [0, 1, 2, 3, "zUpFaceX"])
+@pytest.mark.parametrize("rotaxis", ["y", "x", "g"])
+def test_changeOrientations(rng, orientation, rotaxis):
+    mats = sampleMatrices(rng, 50)
+    mats[:,:3,3] = rng.normal(size=(len(mats), 3))
+    offset = [0.1, -0.2, 0.3]
+    batched = mquat.changeOrientations(mats, orientation, rotaxis, offset)
+    scalar = np.asarray([mquat.changeOrientation(m, orientation, rotaxis, offset) for m in mats])
+    assert np.allclose(batched, scalar, atol=1e-12)
+
+def test_changeOrientationsUnknown():
+    assert mquat.changeOrientations(np.identity(4)[None], "unknown") is None